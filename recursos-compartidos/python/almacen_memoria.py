@@ -0,0 +1,371 @@
+# Estructuras de almacenamiento en memoria compartidas por los proyectos
+# de la Semana 2 (biblioteca) y la Semana 3 (productos); la Semana 1 solo
+# usa IdAllocator.
+# Solo usa la biblioteca estándar y FastAPI, así que funciona con el entorno
+# de cualquiera de las dos semanas (Pydantic v1 o v2).
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+import itertools
+import json
+import threading
+
+from fastapi import Response
+
+T = TypeVar("T")
+
+class StoreIndex(ABC):
+    """Índice secundario que el almacén mantiene en cada escritura.
+
+    Cada operación se aplica entera o lanza la excepción sin modificar el
+    índice: así el almacén puede deshacer los demás índices si uno falla.
+    """
+
+    @abstractmethod
+    def add(self, record_id: int, record: dict) -> None:
+        ...
+
+    @abstractmethod
+    def discard(self, record_id: int, record: dict) -> None:
+        ...
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        self.discard(record_id, old)
+        try:
+            self.add(record_id, new)
+        except BaseException:
+            self.add(record_id, old)
+            raise
+
+    def change(self, record_id: int, old: Optional[dict], new: Optional[dict]) -> None:
+        """add, discard o replace según cuál de los dos registros sea None"""
+        if old is None:
+            self.add(record_id, new)
+        elif new is None:
+            self.discard(record_id, old)
+        else:
+            self.replace(record_id, old, new)
+
+class IdAllocator:
+    """Entrega IDs consecutivos sin repetir aunque se llame desde varios hilos"""
+
+    def __init__(self, start: int = 1):
+        self._next = start
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            value = self._next
+            self._next += 1
+            return value
+
+    def peek(self) -> int:
+        """Próximo ID que se entregará (se guarda en el snapshot)"""
+        return self._next
+
+    def advance(self, last_id: int) -> None:
+        """Continuar después de ``last_id`` (IDs recuperados del disco)"""
+        with self._lock:
+            self._next = max(self._next, last_id + 1)
+
+class FieldIndex(StoreIndex):
+    """Índice valor -> IDs en orden ascendente, para filtros por igualdad"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._ids: Dict[Any, List[int]] = {}
+
+    def add(self, record_id: int, record: dict) -> None:
+        insort(self._ids.setdefault(record[self.field], []), record_id)
+
+    def discard(self, record_id: int, record: dict) -> None:
+        ids = self._ids.get(record[self.field])
+        if ids:
+            position = bisect_left(ids, record_id)
+            if position < len(ids) and ids[position] == record_id:
+                del ids[position]
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        if old[self.field] != new[self.field]:
+            super().replace(record_id, old, new)
+
+    def count(self, value: Any) -> int:
+        return len(self._ids.get(value, ()))
+
+    def iter_ids(self, value: Any, after_id: Optional[int] = None, chunk_size: int = 256) -> Iterator[int]:
+        """IDs mayores que after_id, por bloques y retomando por bisección.
+
+        Retomar desde el último ID visto (y no desde una posición) mantiene
+        el recorrido correcto aunque otro hilo inserte o borre mientras tanto.
+        """
+        ids = self._ids.get(value, [])
+        last = -1 if after_id is None else after_id
+        while True:
+            start = bisect_right(ids, last)
+            chunk = ids[start:start + chunk_size]
+            if not chunk:
+                return
+            yield from chunk
+            last = chunk[-1]
+
+def encode_json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+class JsonCache(StoreIndex):
+    """JSON ya serializado de cada registro, para responder sin reconstruir modelos.
+
+    Los registros ya se validaron al escribirse, así que las lecturas pueden
+    enviar estos bytes directamente. Se calcula en la primera lectura y se
+    descarta en cada escritura; como los registros nunca se modifican en el
+    lugar, comparar la identidad del registro basta para no servir bytes viejos.
+
+    ``store`` es el almacén dueño de los registros: antes de guardar bytes se
+    comprueba, con su lock, que el registro sigue publicado. Sin eso, un lector
+    que obtuvo el registro justo antes de un borrado lo volvería a cachear.
+
+    Guarda como mucho ``max_entries`` registros (al superarlo se descartan los
+    más antiguos), para no duplicar en memoria todo el almacén serializado.
+    """
+
+    def __init__(self, store, fields: List[str], max_entries: int = 100_000):
+        self.fields = fields
+        self.max_entries = max_entries
+        self._store = store
+        self._encoded: Dict[int, Tuple[Mapping, bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._encoded)
+
+    def add(self, record_id: int, record: dict) -> None:
+        self._encoded.pop(record_id, None)
+
+    def discard(self, record_id: int, record: dict) -> None:
+        self._encoded.pop(record_id, None)
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        self._encoded.pop(record_id, None)
+
+    def encode(self, record: Mapping, store: bool = True) -> bytes:
+        """JSON del registro; con ``store=False`` no se guarda (exportaciones)"""
+        record_id = record["id"]
+        cached = self._encoded.get(record_id)
+        if cached is not None and cached[0] is record:
+            return cached[1]
+        # Los enums heredan de str, así que json los escribe como su valor
+        encoded = json.dumps(
+            {field: record[field] for field in self.fields},
+            default=encode_json_default,
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+        if store:
+            # Las escrituras del almacén (y sus add/discard) toman este mismo lock
+            with self._store.lock:
+                if self._store.get(record_id) is record:
+                    self._encoded[record_id] = (record, encoded)
+                    while len(self._encoded) > self.max_entries:
+                        del self._encoded[next(iter(self._encoded))]
+        return encoded
+
+    def response(self, record: Mapping) -> Response:
+        return Response(content=self.encode(record), media_type="application/json")
+
+    def list_response(self, records: List[Mapping]) -> Response:
+        content = b"[" + b",".join(self.encode(record) for record in records) + b"]"
+        return Response(content=content, media_type="application/json")
+
+class CompactRecord(Mapping):
+    """Registro de solo lectura con __slots__ que se usa como un dict.
+
+    Ocupa bastante menos memoria que un dict por registro: no hay tabla hash
+    por instancia, las fechas se guardan como epoch (float) y los enums como
+    referencias a sus miembros (o a su ``.value`` con ``ENUM_VALUES = True``,
+    para modelos con ``use_enum_values``).
+
+    Las fechas son naive (como las de ``datetime.now()``) y su epoch se calcula
+    leyéndolas como UTC, sin pasar por la hora local: así vuelven idénticas
+    también en el cambio de horario, donde una misma hora local se repite.
+    Una fecha con zona horaria se guarda convertida a UTC.
+    """
+
+    __slots__ = ()
+    KEYS: Tuple[str, ...] = ()
+    TIMESTAMPS: Tuple[str, ...] = ("created_at", "updated_at")
+    ENUMS: Dict[str, Any] = {}
+    ENUM_VALUES = False
+
+    def __init__(self, data: Mapping):
+        for key in self.KEYS:
+            value = data[key]
+            if key in self.TIMESTAMPS:
+                if value.tzinfo is not None:
+                    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+                object.__setattr__(self, "_" + key, value.replace(tzinfo=timezone.utc).timestamp())
+            else:
+                if key in self.ENUMS:
+                    value = self.ENUMS[key](value)
+                    if self.ENUM_VALUES:
+                        value = value.value
+                object.__setattr__(self, key, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Los registros son inmutables: usa InMemoryStore.update")
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.TIMESTAMPS:
+            return datetime.fromtimestamp(getattr(self, "_" + key), tz=timezone.utc).replace(tzinfo=None)
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+class InMemoryStore:
+    """Diccionario de registros seguro para los endpoints sync del threadpool.
+
+    Las lecturas no toman el lock porque ningún registro se modifica en el
+    lugar: cada escritura publica un registro nuevo. Las escrituras se
+    serializan con ``lock`` (un RLock); los endpoints usan ``write()`` para
+    que una verificación (p. ej. de nombre único) y la escritura sean una
+    sola operación.
+
+    ``record_type`` construye cada registro a partir de un dict (por
+    defecto se guarda el dict tal cual). Las subclases que persisten en
+    disco redefinen ``write()``, ``_log_put()`` y ``_log_delete()``.
+    """
+
+    def __init__(self, record_type: Callable[[dict], Mapping] = dict):
+        self._records: Dict[int, Mapping] = {}
+        self._record_type = record_type
+        self._ids = IdAllocator()
+        self._indexes: List[StoreIndex] = []
+        self.lock = threading.RLock()
+
+    def add_index(self, index: StoreIndex) -> StoreIndex:
+        """Registrar un índice y cargarlo con los registros existentes"""
+        with self.lock:
+            for record_id, record in self._records.items():
+                index.add(record_id, record)
+            self._indexes.append(index)
+        return index
+
+    def __contains__(self, record_id: int) -> bool:
+        return record_id in self._records
+
+    def __getitem__(self, record_id: int) -> Mapping:
+        return self._records[record_id]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, record_id: int) -> Optional[Mapping]:
+        return self._records.get(record_id)
+
+    def get_many(self, record_ids: List[int]) -> List[Mapping]:
+        """Registros de los IDs dados, omitiendo los que ya no existen"""
+        records = (self._records.get(record_id) for record_id in record_ids)
+        return [record for record in records if record is not None]
+
+    def first(self, limit: int) -> List[Mapping]:
+        """Los primeros registros en orden de inserción"""
+        return list(itertools.islice(self._records.values(), limit))
+
+    def values(self) -> List[Mapping]:
+        # list() sobre la vista del dict es una copia atómica
+        return list(self._records.values())
+
+    def items(self) -> List[Tuple[int, Mapping]]:
+        return list(self._records.items())
+
+    @property
+    def next_id(self) -> int:
+        return self._ids.peek()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Bloque de escrituras atómico (toma ``lock``)"""
+        with self.lock:
+            yield
+
+    def _log_put(self, record: Mapping) -> None:
+        """Anotar un registro nuevo o actualizado (sin persistencia no hace nada)"""
+
+    def _log_delete(self, record_id: int) -> None:
+        """Anotar un borrado (sin persistencia no hace nada)"""
+
+    def _publish(self, record_id: int, old: Optional[Mapping], new: Optional[Mapping], log: bool = True) -> None:
+        """Aplicar un cambio (None = sin registro): índices, log y ``_records``.
+
+        Los índices van primero. Si uno rechaza el registro, o si falla el
+        log, se deshacen los que ya se habían actualizado y ni el log ni
+        ``_records`` cambian. ``log=False`` aplica registros que ya vienen
+        del disco. Se llama con ``lock`` tomado.
+        """
+        applied: List[StoreIndex] = []
+        try:
+            for index in self._indexes:
+                index.change(record_id, old, new)
+                applied.append(index)
+            if log:
+                if new is None:
+                    self._log_delete(record_id)
+                else:
+                    self._log_put(new)
+        except BaseException:
+            for index in reversed(applied):
+                index.change(record_id, new, old)
+            raise
+        if new is None:
+            del self._records[record_id]
+        else:
+            self._records[record_id] = new
+
+    def insert(self, data: dict) -> Mapping:
+        """Guardar un registro nuevo asignándole el siguiente ID"""
+        with self.write():
+            record_id = self._ids.next()
+            record = self._record_type(dict(data, id=record_id))
+            self._publish(record_id, None, record)
+        return record
+
+    def update(self, record_id: int, changes: dict) -> Optional[Mapping]:
+        """Publicar una copia del registro con los cambios; None si no existe"""
+        with self.write():
+            current = self._records.get(record_id)
+            if current is None:
+                return None
+            record = self._record_type(dict(current, **changes))
+            self._publish(record_id, current, record)
+        return record
+
+    def pop(self, record_id: int) -> Optional[Mapping]:
+        with self.write():
+            record = self._records.get(record_id)
+            if record is None:
+                return None
+            self._publish(record_id, record, None)
+        return record
+
+async def iter_batches(items: AsyncIterator[T], size: int) -> AsyncIterator[List[T]]:
+    """Agrupar un iterador async en listas de hasta ``size`` elementos"""
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,64 @@
+# Utilidades de medición compartidas por los benchmark.py de la Semana 2
+# (biblioteca) y la Semana 3 (productos).
+# Solo usa la biblioteca estándar.
+
+import gc
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+def measure(func: Callable[[], object], repetitions: int) -> float:
+    """Segundos promedio por ejecución"""
+    func()  # Calentamiento
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        func()
+    return (time.perf_counter() - start) / repetitions
+
+def bytes_per_record(build: Callable[[dict], object], sample: Callable[[int], dict], total: int) -> float:
+    """Bytes por registro al construir ``total`` registros con ``build(sample(i))``"""
+    gc.collect()
+    tracemalloc.start()
+    records = [build(sample(i)) for i in range(total)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    gc.collect()
+    return size / total
+
+# Se ejecuta en un proceso nuevo (desde la carpeta del proyecto) para medir
+# un arranque en frío real; {path} es la ruta de la primera petición
+STARTUP_SCRIPT = """
+import time
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+import ejemplo_main
+imported = time.perf_counter()
+with TestClient(ejemplo_main.app) as client:
+    client.get("{path}")
+print(imported - start, time.perf_counter() - imported)
+"""
+
+def measure_startup(path: str, seed: bool, runs: int) -> List[float]:
+    """Mediana de (importación, arranque + primera petición) en segundos"""
+    env = dict(os.environ, SEED_SAMPLE_DATA="1" if seed else "0")
+    script = STARTUP_SCRIPT.format(path=path)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", script],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append([float(value) for value in output.split()])
+    return [statistics.median(column) for column in zip(*samples)]
+
+def bench_startup(path: str, runs: int = 7):
+    """Arranque de un worker: importación en frío + primera petición a ``path``"""
+    for label, seed in (("con datos de ejemplo", True), ("SEED_SAMPLE_DATA=0", False)):
+        imported, first_request = measure_startup(path, seed, runs)
+        print(f"   {label:<22} importación {imported * 1000:7.1f} ms | "
+              f"arranque + primera petición {first_request * 1000:7.1f} ms")
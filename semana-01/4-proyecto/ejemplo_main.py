@@ -1,9 +1,18 @@
 # Mi Primera API con FastAPI - Ejemplo Base
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime
+from bisect import bisect_left, insort
+from pathlib import Path
+import sys
+import threading
+
+# Generador de IDs compartido con las Semanas 2 y 3
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "recursos-compartidos" / "python"))
+from almacen_memoria import IdAllocator
 
 # Crear la aplicación FastAPI
 app = FastAPI(
@@ -20,9 +29,70 @@ class Task(BaseModel):
     completed: bool = False
     created_at: Optional[str] = None
 
-# Base de datos en memoria (lista simple)
-tasks_db: List[Task] = []
-next_id = 1
+# Almacén en memoria indexado por ID
+class TaskStore:
+    """Tareas indexadas por ID, con índice secundario por estado completado.
+
+    Las tareas guardadas no se modifican: un cambio publica una copia nueva.
+    get() no toma el lock; page() sí, porque lee las listas de IDs que
+    set_completed() mueve de un estado a otro.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, Task] = {}
+        self._ids: List[int] = []
+        # IDs ordenados de forma ascendente para cada estado
+        self._ids_by_completed: Dict[bool, List[int]] = {True: [], False: []}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, task: Task) -> Task:
+        with self._lock:
+            self._by_id[task.id] = task
+            insort(self._ids, task.id)
+            insort(self._ids_by_completed[task.completed], task.id)
+        return task
+
+    def get(self, task_id: int) -> Optional[Task]:
+        return self._by_id.get(task_id)
+
+    def page(
+        self, completed: Optional[bool] = None, after_id: Optional[int] = None, limit: int = 100
+    ) -> List[Task]:
+        """Página de tareas con ID mayor que after_id (paginación por cursor)"""
+        with self._lock:
+            ids = self._ids if completed is None else self._ids_by_completed[completed]
+            start = 0 if after_id is None else bisect_left(ids, after_id + 1)
+            return [self._by_id[task_id] for task_id in ids[start:start + limit]]
+
+    def iter_pages(
+        self, completed: Optional[bool] = None, after_id: Optional[int] = None, page_size: int = 1000
+    ) -> Iterator[List[Task]]:
+        """Recorrer todas las tareas por páginas sin copiar la colección completa"""
+        while True:
+            tasks = self.page(completed, after_id, page_size)
+            if not tasks:
+                return
+            yield tasks
+            after_id = tasks[-1].id
+
+    def set_completed(self, task: Task, completed: bool) -> Task:
+        with self._lock:
+            # Releer bajo el lock: `task` puede ser una versión ya reemplazada
+            task = self._by_id[task.id]
+            if task.completed != completed:
+                updated = task.model_copy(update={"completed": completed})
+                old_ids = self._ids_by_completed[task.completed]
+                del old_ids[bisect_left(old_ids, task.id)]
+                insort(self._ids_by_completed[completed], task.id)
+                self._by_id[task.id] = updated
+                task = updated
+        return task
+
+tasks_db = TaskStore()
+task_ids = IdAllocator()
 
 @app.get("/")
 def read_root():
@@ -41,44 +111,56 @@ def read_root():
 @app.post("/tasks", response_model=Task)
 def create_task(task: Task):
     """Crear una nueva tarea"""
-    global next_id
-    
     # Asignar ID y timestamp
-    task.id = next_id
+    task.id = task_ids.next()
     task.created_at = datetime.now().isoformat()
-    next_id += 1
     
     # Agregar a la "base de datos"
-    tasks_db.append(task)
+    tasks_db.add(task)
     
     return task
 
 @app.get("/tasks", response_model=List[Task])
-def get_tasks(completed: Optional[bool] = None):
-    """Listar todas las tareas, opcionalmente filtrar por estado"""
-    if completed is None:
-        return tasks_db
+def get_tasks(
+    response: Response,
+    completed: Optional[bool] = None,
+    after_id: Optional[int] = Query(None, ge=0, description="Cursor: devolver tareas con ID mayor a este"),
+    limit: int = Query(100, ge=1, le=1000, description="Tamaño máximo de página"),
+    stream: bool = Query(False, description="Transmitir todas las tareas como NDJSON")
+):
+    """Listar tareas paginadas por cursor, opcionalmente filtrar por estado"""
+    if stream:
+        # NDJSON: una tarea por línea, generada página a página
+        def generate_ndjson():
+            for tasks in tasks_db.iter_pages(completed, after_id):
+                yield "".join(task.model_dump_json() + "\n" for task in tasks)
+
+        return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
+    
+    # Pedir un elemento extra para saber si existe una página siguiente
+    tasks = tasks_db.page(completed, after_id, limit + 1)
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        response.headers["X-Next-Cursor"] = str(tasks[-1].id)
     
-    # Filtrar por estado completado
-    return [task for task in tasks_db if task.completed == completed]
+    return tasks
 
 @app.get("/tasks/{task_id}", response_model=Task)
 def get_task(task_id: int):
     """Obtener una tarea específica por ID"""
-    for task in tasks_db:
-        if task.id == task_id:
-            return task
+    task = tasks_db.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
     
-    raise HTTPException(status_code=404, detail="Tarea no encontrada")
+    return task
 
 @app.put("/tasks/{task_id}/complete", response_model=Task)
 def complete_task(task_id: int):
     """Marcar una tarea como completada"""
-    for task in tasks_db:
-        if task.id == task_id:
-            task.completed = True
-            return task
+    task = tasks_db.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
     
-    raise HTTPException(status_code=404, detail="Tarea no encontrada")
+    return tasks_db.set_completed(task, True)
 
 # Para ejecutar: uvicorn main:app --reload
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de rendimiento para la API de Biblioteca Personal
+Ejecutar: python benchmark.py [nombre_benchmark]
+Sin argumentos se ejecutan todos los benchmarks.
+
+No necesita el servidor corriendo: usa TestClient sobre ejemplo_main.app
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from fastapi.testclient import TestClient
+
+# Utilidades de medición compartidas con la Semana 3
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "recursos-compartidos" / "python"))
+import medicion
+from medicion import bytes_per_record, measure
+
+from ejemplo_main import app, books_db, BookCreate, BookRecord, BookResponse, create_book_record
+
+client = TestClient(app)
+
+def ensure_books(total: int):
+    """Completar la biblioteca hasta tener al menos `total` libros"""
+    for i in range(len(books_db), total):
+        create_book_record(BookCreate(
+            title=f"Libro de prueba {i}",
+            author=f"Autor {i % 500}",
+            genre="technology" if i % 2 else "fiction",
+            pages=100 + i % 900,
+            publication_year=1900 + i % 120,
+            status="reading" if i % 3 else "to_read",
+            notes="Generado por benchmark.py"
+        ))
+
+# ==================== BENCHMARKS ====================
+
+# Ruta con el camino anterior: BookResponse(**book) + validación del response_model
+@app.get("/benchmark/legacy-books", response_model=List[BookResponse], include_in_schema=False)
+def legacy_get_books(limit: int = 100):
+    return [BookResponse(**book) for book in books_db.first(limit)]
+
+def bench_list_serialization():
+    """GET /books?limit=100: modelos reconstruidos vs JSON pre-serializado"""
+    ensure_books(10_000)
+    repetitions = 200
+
+    legacy = measure(lambda: client.get("/benchmark/legacy-books?limit=100"), repetitions)
+    fast = measure(lambda: client.get("/books?limit=100"), repetitions)
+
+    assert client.get("/benchmark/legacy-books?limit=100").json() == client.get("/books?limit=100").json()
+
+    print(f"   Camino anterior:      {legacy * 1000:8.2f} ms/petición ({1 / legacy:8.0f} req/s)")
+    print(f"   JSON pre-serializado: {fast * 1000:8.2f} ms/petición ({1 / fast:8.0f} req/s)")
+    print(f"   Mejora: {legacy / fast:.1f}x")
+
+def sample_book_data(i: int) -> dict:
+    """Datos de un libro como llegarían de un JSON: cadenas y fechas nuevas"""
+    now = datetime(2024, 1, 1) + timedelta(seconds=i)
+    return {
+        "title": f"Libro de prueba {i}",
+        "author": f"Autor {i % 500}",
+        "isbn": f"978{i:010d}",
+        "genre": "technology".encode().decode(),
+        "pages": 100 + i % 900,
+        "publication_year": 1900 + i % 120,
+        "status": "reading".encode().decode(),
+        "rating": None,
+        "notes": None,
+        "id": i,
+        "created_at": now,
+        "updated_at": now + timedelta(microseconds=1)
+    }
+
+def bench_record_memory(total: int = 1_000_000):
+    """Bytes por libro en memoria: dict vs BookRecord (__slots__)"""
+    as_dict = bytes_per_record(dict, sample_book_data, total)
+    compact = bytes_per_record(BookRecord, sample_book_data, total)
+
+    print(f"   Registros medidos: {total:,}")
+    print(f"   dict por libro:       {as_dict:8.0f} bytes/registro ({as_dict * total / 2**20:8.1f} MiB)")
+    print(f"   BookRecord:           {compact:8.0f} bytes/registro ({compact * total / 2**20:8.1f} MiB)")
+    print(f"   Ahorro: {(1 - compact / as_dict) * 100:.0f}%")
+
+def bench_startup():
+    """Arranque de un worker: importación en frío + primera petición"""
+    medicion.bench_startup("/books")
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "list_serialization": bench_list_serialization,
+    "record_memory": bench_record_memory,
+    "startup": bench_startup,
+}
+
+def main():
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"❌ Benchmark desconocido: {name}. Disponibles: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"\n⏱️  {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
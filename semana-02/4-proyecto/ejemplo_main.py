@@ -1,12 +1,23 @@
 # Ejemplo básico para Proyecto Semana 2: API de Biblioteca Personal
 # Este archivo muestra la estructura básica y algunos endpoints de ejemplo
 
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field, StrictInt, ValidationError, validator
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Set, Tuple, Any, AsyncIterator, Awaitable, Callable, Hashable
+from collections import OrderedDict
 import asyncio
+import json
+import os
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+# Estructuras de almacenamiento compartidas con la Semana 3
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "recursos-compartidos" / "python"))
+from almacen_memoria import CompactRecord, FieldIndex, InMemoryStore, JsonCache, StoreIndex, iter_batches
 
 # ==================== MODELOS PYDANTIC ====================
 
@@ -54,11 +65,114 @@ class BookUpdate(BaseModel):
     rating: Optional[int] = Field(None, ge=1, le=5)
     notes: Optional[str] = Field(None, max_length=1000)
 
+    # Omitir un campo lo deja como está; null solo vale para los que admiten None
+    @validator("title", "author", "genre", "status", pre=True)
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("no puede ser null")
+        return value
+
 class BookResponse(BookBase):
     id: int
     created_at: datetime
     updated_at: datetime
 
+class BookEnrichRequest(BaseModel):
+    book_ids: List[int] = Field(..., min_items=1, max_items=500, description="IDs de los libros a enriquecer")
+
+class BookBulkDeleteRequest(BaseModel):
+    ids: List[StrictInt] = Field(..., min_items=1, max_items=10000, description="IDs de los libros a eliminar")
+
+# ==================== ALMACENAMIENTO EN MEMORIA ====================
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin acentos: 'Cervantes Saavedra' == 'cervántes saavedra'"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+class TextIndex(StoreIndex):
+    """Índice invertido de n-gramas para búsquedas por subcadena.
+
+    Cada palabra normalizada se descompone en sus n-gramas de 1 a ``ngram``
+    caracteres. Una búsqueda intersecta las listas de IDs de los n-gramas de
+    cada término (AND entre términos) y solo verifica esos candidatos.
+    """
+
+    def __init__(self, field: str, ngram: int = 3):
+        self.field = field
+        self.ngram = ngram
+        self._postings: Dict[str, Set[int]] = {}
+        self._texts: Dict[int, str] = {}
+
+    def _grams(self, text: str) -> Set[str]:
+        grams = set()
+        for token in text.split():
+            for size in range(1, self.ngram + 1):
+                for start in range(len(token) - size + 1):
+                    grams.add(token[start:start + size])
+        return grams
+
+    def add(self, record_id: int, record: dict) -> None:
+        text = normalize_text(record[self.field])
+        self._texts[record_id] = text
+        for gram in self._grams(text):
+            self._postings.setdefault(gram, set()).add(record_id)
+
+    def discard(self, record_id: int, record: dict) -> None:
+        text = self._texts.pop(record_id, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(record_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        if old[self.field] != new[self.field]:
+            super().replace(record_id, old, new)
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """IDs (ascendentes) cuyo texto contiene todos los términos de la consulta"""
+        terms = normalize_text(query).split()
+        if not terms:
+            return []
+        
+        grams = set()
+        for term in terms:
+            if len(term) <= self.ngram:
+                grams.add(term)
+            else:
+                grams.update(term[i:i + self.ngram] for i in range(len(term) - self.ngram + 1))
+        
+        # Empezar por el n-grama menos frecuente para reducir la intersección
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                return []
+        
+        matches = []
+        for record_id in sorted(candidates):
+            text = self._texts.get(record_id)
+            if text is not None and all(term in text for term in terms):
+                matches.append(record_id)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+class BookRecord(CompactRecord):
+    __slots__ = (
+        "title", "author", "isbn", "genre", "pages", "publication_year",
+        "status", "rating", "notes", "id", "_created_at", "_updated_at"
+    )
+    KEYS = tuple(BookResponse.__fields__)
+    # use_enum_values guarda cadenas; .value del enum es una cadena compartida
+    ENUMS = {"genre": BookGenre, "status": BookStatus}
+    ENUM_VALUES = True
+
 # ==================== CONFIGURACIÓN FASTAPI ====================
 
 app = FastAPI(
@@ -68,8 +182,14 @@ app = FastAPI(
 )
 
 # Base de datos en memoria
-books_db: Dict[int, dict] = {}
-next_id: int = 1
+books_db = InMemoryStore(BookRecord)
+title_index = books_db.add_index(TextIndex("title"))
+author_index = books_db.add_index(TextIndex("author"))
+status_index = books_db.add_index(FieldIndex("status"))
+genre_index = books_db.add_index(FieldIndex("genre"))
+books_json = books_db.add_index(JsonCache(
+    books_db, list(BookResponse.__fields__), max_entries=int(os.getenv("JSON_CACHE_SIZE", "100000"))
+))
 
 # ==================== FUNCIONES AUXILIARES ====================
 
@@ -77,16 +197,133 @@ def get_current_time() -> datetime:
     return datetime.now()
 
 def create_book_record(book_data: BookCreate) -> dict:
-    global next_id
     book_dict = book_data.dict()
     book_dict.update({
-        "id": next_id,
         "created_at": get_current_time(),
         "updated_at": get_current_time()
     })
-    books_db[next_id] = book_dict
-    next_id += 1
-    return book_dict
+    return books_db.insert(book_dict)
+
+# ==================== CACHÉ ASYNC ====================
+
+class AsyncTTLCache:
+    """Caché para funciones async con TTL, desalojo LRU y llamadas coalescidas.
+
+    - Los valores "negativos" (falsy, p. ej. un ISBN inválido) se guardan con
+      su propio TTL, normalmente más corto.
+    - Si varias peticiones piden la misma clave mientras se está cargando,
+      todas esperan la misma llamada en vuelo (single-flight).
+    - Con ``stale_ttl`` > 0 (stale-while-revalidate) un valor vencido hace
+      menos de ``stale_ttl`` segundos se devuelve al instante y se refresca
+      en segundo plano.
+    - Las excepciones no se guardan: la siguiente petición vuelve a intentar.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        negative_ttl: float = 300.0,
+        stale_ttl: float = 0.0
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        # clave -> (instante de expiración, valor); el orden es el de uso (LRU)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            now = time.monotonic()
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if expires_at + self.stale_ttl > now:
+                # Servir el valor vencido y refrescarlo sin hacer esperar al cliente
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._in_flight:
+                    self._start_load(key, loader)
+                return value
+            del self._entries[key]
+        
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._start_load(key, loader)
+        else:
+            self.coalesced += 1
+        
+        # shield: si una petición se cancela (timeout, desconexión) la carga
+        # compartida sigue para las demás
+        return await asyncio.shield(task)
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> "asyncio.Future[Any]":
+        task = asyncio.ensure_future(self._load(key, loader))
+        # Marcar la excepción como recuperada aunque nadie espere el refresco
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._in_flight[key] = task
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self.set(key, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        ttl = self.ttl if value else self.negative_ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        served_from_cache = self.hits + self.stale_hits + self.coalesced
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "hit_ratio": round(served_from_cache / lookups, 4) if lookups else 0.0
+        }
+
+isbn_cache = AsyncTTLCache(
+    maxsize=int(os.getenv("ISBN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("ISBN_CACHE_TTL", "86400")),
+    negative_ttl=float(os.getenv("ISBN_CACHE_NEGATIVE_TTL", "3600"))
+)
+
+# La metadata de un título/autor cambia poco: se sirve aunque esté vencida
+# mientras se refresca en segundo plano
+metadata_cache = AsyncTTLCache(
+    maxsize=int(os.getenv("METADATA_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("METADATA_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("METADATA_CACHE_STALE_TTL", "3600"))
+)
 
 # ==================== FUNCIONES ASYNC ====================
 
@@ -106,6 +343,189 @@ async def get_book_metadata(title: str, author: str) -> dict:
         "cover_url": f"https://covers.openlibrary.org/b/title/{title.replace(' ', '+')}-M.jpg"
     }
 
+async def validate_isbn_cached(isbn: str) -> bool:
+    """Validación externa de ISBN pasando por la caché"""
+    clean_isbn = isbn.replace('-', '').replace(' ', '')
+    return await isbn_cache.get_or_load(clean_isbn, lambda: validate_isbn_external(isbn))
+
+async def get_book_metadata_cached(title: str, author: str) -> dict:
+    """Metadata externa pasando por la caché (stale-while-revalidate)"""
+    return await metadata_cache.get_or_load((title, author), lambda: get_book_metadata(title, author))
+
+# Límites para las llamadas a servicios externos (configurables por entorno).
+# EXTERNAL_CONCURRENCY es el valor por defecto de cada petición;
+# EXTERNAL_MAX_CONCURRENCY es el tope para todo el proceso, sumando peticiones
+EXTERNAL_CONCURRENCY = int(os.getenv("EXTERNAL_CONCURRENCY", "10"))
+EXTERNAL_MAX_CONCURRENCY = int(os.getenv("EXTERNAL_MAX_CONCURRENCY", "20"))
+EXTERNAL_TIMEOUT = float(os.getenv("EXTERNAL_TIMEOUT", "2.0"))
+
+# Semáforo global, creado en el event loop que lo usa (uno por loop)
+_external_limit: Tuple[Optional[asyncio.AbstractEventLoop], Optional[asyncio.Semaphore]] = (None, None)
+
+def external_semaphore() -> asyncio.Semaphore:
+    """Semáforo global del loop actual; solo se llama desde corrutinas"""
+    global _external_limit
+    loop = asyncio.get_running_loop()
+    if _external_limit[0] is not loop:
+        _external_limit = (loop, asyncio.Semaphore(EXTERNAL_MAX_CONCURRENCY))
+    return _external_limit[1]
+
+async def call_external(coro, semaphore: asyncio.Semaphore, timeout: float = EXTERNAL_TIMEOUT):
+    """Ejecutar una llamada externa respetando el límite de la petición, el global y el timeout"""
+    # Primero el de la petición: así una petición solo ocupa plazas globales que va a usar
+    async with semaphore:
+        async with external_semaphore():
+            return await asyncio.wait_for(coro, timeout)
+
+def describe_external_error(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return f"error: {error}"
+
+async def enrich_book(book: dict, semaphore: asyncio.Semaphore) -> dict:
+    """Validar ISBN y obtener metadata de un libro, ambas llamadas en paralelo"""
+    result = {
+        "id": book["id"],
+        "title": book["title"],
+        "isbn_valid": None,
+        "external_metadata": None,
+        "errors": {}
+    }
+    
+    calls = {"metadata": get_book_metadata_cached(book["title"], book["author"])}
+    if book["isbn"]:
+        calls["isbn"] = validate_isbn_cached(book["isbn"])
+    
+    outcomes = await asyncio.gather(
+        *(call_external(coro, semaphore) for coro in calls.values()),
+        return_exceptions=True
+    )
+    
+    for name, outcome in zip(calls, outcomes):
+        if isinstance(outcome, BaseException):
+            result["errors"][name] = describe_external_error(outcome)
+        elif name == "isbn":
+            result["isbn_valid"] = outcome
+        else:
+            result["external_metadata"] = outcome
+    
+    return result
+
+# ==================== OPERACIONES EN LOTE ====================
+
+# Cantidad de elementos que se validan y guardan juntos en las cargas masivas
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+
+# (posición, elemento, error de lectura)
+BulkItem = Tuple[int, Any, Optional[str]]
+
+async def iter_bulk_items(request: Request) -> AsyncIterator[BulkItem]:
+    """Elementos de un cuerpo JSON (arreglo) o NDJSON (un objeto por línea).
+
+    El NDJSON se procesa a medida que llega, sin leer todo el cuerpo.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="El cuerpo no es JSON válido")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un arreglo JSON")
+        for index, item in enumerate(items):
+            yield index, item, None
+        return
+    
+    index = 0
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_line(index, line)
+                index += 1
+    if pending.strip():
+        yield parse_ndjson_line(index, pending)
+
+def parse_ndjson_line(index: int, line: bytes) -> BulkItem:
+    try:
+        return index, json.loads(line), None
+    except ValueError:
+        return index, None, "Línea NDJSON inválida"
+
+def bulk_error(index: int, errors: Any) -> dict:
+    return {"index": index, "status": "error", "errors": errors}
+
+async def check_isbn(book: BookCreate, semaphore: asyncio.Semaphore) -> bool:
+    if not book.isbn:
+        return True
+    return await call_external(validate_isbn_cached(book.isbn), semaphore)
+
+async def create_books_batch(batch: List[BulkItem], semaphore: asyncio.Semaphore) -> List[dict]:
+    """Validar un lote, verificar sus ISBN en paralelo y guardar los válidos"""
+    results = []
+    valid_books = []
+    for index, item, read_error in batch:
+        if read_error:
+            results.append(bulk_error(index, read_error))
+            continue
+        try:
+            valid_books.append((index, BookCreate.parse_obj(item)))
+        except ValidationError as error:
+            results.append(bulk_error(index, error.errors()))
+    
+    checks = await asyncio.gather(
+        *(check_isbn(book, semaphore) for _, book in valid_books),
+        return_exceptions=True
+    )
+    
+    for (index, book), isbn_valid in zip(valid_books, checks):
+        if isinstance(isbn_valid, BaseException):
+            results.append(bulk_error(index, f"Validación de ISBN: {describe_external_error(isbn_valid)}"))
+        elif not isbn_valid:
+            results.append(bulk_error(index, "ISBN inválido según validación externa"))
+        else:
+            record = create_book_record(book)
+            results.append({"index": index, "status": "created", "id": record["id"]})
+    
+    results.sort(key=lambda result: result["index"])
+    return results
+
+def update_books_batch(batch: List[BulkItem]) -> List[dict]:
+    """Aplicar actualizaciones parciales; cada elemento debe incluir su "id" """
+    results = []
+    for index, item, read_error in batch:
+        if read_error:
+            results.append(bulk_error(index, read_error))
+            continue
+        # bool es subclase de int: sin excluirlo, true/false actualizarían los libros 1/0
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int) or isinstance(item["id"], bool):
+            results.append(bulk_error(index, "Cada elemento debe incluir un \"id\" entero"))
+            continue
+        
+        fields = {key: value for key, value in item.items() if key != "id"}
+        try:
+            update_data = BookUpdate.parse_obj(fields).dict(exclude_unset=True)
+        except ValidationError as error:
+            results.append(bulk_error(index, error.errors()))
+            continue
+        
+        update_data["updated_at"] = get_current_time()
+        if books_db.update(item["id"], update_data) is None:
+            results.append(bulk_error(index, "Libro no encontrado"))
+        else:
+            results.append({"index": index, "status": "updated", "id": item["id"]})
+    return results
+
+def summarize_bulk(results: List[dict], success_status: str) -> dict:
+    succeeded = sum(1 for result in results if result["status"] == success_status)
+    return {
+        success_status: succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
 # ==================== ENDPOINTS ====================
 
 @app.get("/")
@@ -125,7 +545,7 @@ async def create_book(book: BookCreate):
     """Crear un nuevo libro (ASYNC)"""
     # Validar ISBN externamente si está presente
     if book.isbn:
-        isbn_valid = await validate_isbn_external(book.isbn)
+        isbn_valid = await validate_isbn_cached(book.isbn)
         if not isbn_valid:
             raise HTTPException(status_code=400, detail="ISBN inválido según validación externa")
     
@@ -140,69 +560,109 @@ def get_books(
     limit: int = Query(default=100, le=100, ge=1)
 ):
     """Listar todos los libros con filtros opcionales"""
-    books = list(books_db.values())
+    filters = []
+    if status is not None:
+        filters.append((status_index, status))
+    if genre is not None:
+        filters.append((genre_index, genre))
     
-    # Aplicar filtros
-    if status:
-        books = [book for book in books if book["status"] == status]
-    if genre:
-        books = [book for book in books if book["genre"] == genre]
+    if not filters:
+        return books_json.list_response(books_db.first(limit))
     
-    # Limitar resultados
-    books = books[:limit]
+    # Recorrer el índice más selectivo y verificar los demás filtros en cada
+    # candidato, deteniéndose al llegar al límite
+    filters.sort(key=lambda item: item[0].count(item[1]))
+    index, value = filters[0]
+    other_filters = filters[1:]
     
-    return [BookResponse(**book) for book in books]
+    books = []
+    for book_id in index.iter_ids(value):
+        book = books_db.get(book_id)
+        if book is None:
+            continue
+        if all(book[other.field] == other_value for other, other_value in other_filters):
+            books.append(book)
+            if len(books) >= limit:
+                break
+    
+    # Los registros ya están validados: se envían sin reconstruir BookResponse
+    return books_json.list_response(books)
 
 @app.get("/books/{book_id}", response_model=BookResponse)
 def get_book(book_id: int):
     """Obtener un libro específico por ID"""
-    if book_id not in books_db:
+    book = books_db.get(book_id)
+    if book is None:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
     
-    return BookResponse(**books_db[book_id])
+    return books_json.response(book)
 
 @app.put("/books/{book_id}", response_model=BookResponse)
 def update_book_complete(book_id: int, book: BookCreate):
     """Actualizar un libro completamente"""
-    if book_id not in books_db:
-        raise HTTPException(status_code=404, detail="Libro no encontrado")
-    
-    # Actualizar con todos los datos nuevos
+    # Actualizar con todos los datos nuevos (se conservan id y created_at)
     updated_data = book.dict()
-    updated_data.update({
-        "id": book_id,
-        "created_at": books_db[book_id]["created_at"],
-        "updated_at": get_current_time()
-    })
+    updated_data["updated_at"] = get_current_time()
     
-    books_db[book_id] = updated_data
-    return BookResponse(**updated_data)
+    updated_book = books_db.update(book_id, updated_data)
+    if updated_book is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    return BookResponse(**updated_book)
 
 @app.patch("/books/{book_id}", response_model=BookResponse)
 def update_book_partial(book_id: int, book: BookUpdate):
     """Actualizar un libro parcialmente"""
-    if book_id not in books_db:
-        raise HTTPException(status_code=404, detail="Libro no encontrado")
-    
     # Actualizar solo los campos proporcionados
-    current_book = books_db[book_id].copy()
     update_data = book.dict(exclude_unset=True)
+    update_data["updated_at"] = get_current_time()
     
-    current_book.update(update_data)
-    current_book["updated_at"] = get_current_time()
-    
-    books_db[book_id] = current_book
-    return BookResponse(**current_book)
+    updated_book = books_db.update(book_id, update_data)
+    if updated_book is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    return BookResponse(**updated_book)
 
 @app.delete("/books/{book_id}")
 def delete_book(book_id: int):
     """Eliminar un libro"""
-    if book_id not in books_db:
+    deleted_book = books_db.pop(book_id)
+    if deleted_book is None:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
     
-    deleted_book = books_db.pop(book_id)
     return {"message": f"Libro '{deleted_book['title']}' eliminado correctamente"}
 
+# ==================== CRUD EN LOTE ====================
+
+@app.post("/books/bulk")
+async def create_books_bulk(
+    request: Request,
+    concurrency: int = Query(EXTERNAL_CONCURRENCY, ge=1, le=100, description="Validaciones de ISBN simultáneas")
+):
+    """Crear muchos libros desde un arreglo JSON o un stream NDJSON (ASYNC)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    async for batch in iter_batches(iter_bulk_items(request), BULK_BATCH_SIZE):
+        results.extend(await create_books_batch(batch, semaphore))
+    return summarize_bulk(results, "created")
+
+@app.post("/books/bulk/update")
+async def update_books_bulk(request: Request):
+    """Actualizar parcialmente muchos libros; cada elemento lleva su "id" """
+    results = []
+    async for batch in iter_batches(iter_bulk_items(request), BULK_BATCH_SIZE):
+        results.extend(update_books_batch(batch))
+    return summarize_bulk(results, "updated")
+
+@app.post("/books/bulk/delete")
+def delete_books_bulk(request: BookBulkDeleteRequest):
+    """Eliminar muchos libros por ID"""
+    results = []
+    for index, book_id in enumerate(request.ids):
+        if books_db.pop(book_id) is None:
+            results.append(bulk_error(index, "Libro no encontrado"))
+        else:
+            results.append({"index": index, "status": "deleted", "id": book_id})
+    return summarize_bulk(results, "deleted")
+
 # ==================== BÚSQUEDAS ====================
 
 @app.get("/books/search/title", response_model=List[BookResponse])
@@ -210,45 +670,29 @@ def search_books_by_title(
     title: str = Query(..., min_length=1, description="Título a buscar"),
     limit: int = Query(10, ge=1, le=50, description="Número máximo de resultados")
 ):
-    """Buscar libros por título (case insensitive)"""
-    matching_books = []
-    search_title = title.lower()
-    
-    for book in books_db.values():
-        if search_title in book["title"].lower():
-            matching_books.append(book)
-            if len(matching_books) >= limit:
-                break
-    
-    return [BookResponse(**book) for book in matching_books]
+    """Buscar libros por título (sin distinguir mayúsculas ni acentos, todos los términos)"""
+    matching_books = books_db.get_many(title_index.search(title, limit))
+    return books_json.list_response(matching_books)
 
 @app.get("/books/search/author", response_model=List[BookResponse])
 def search_books_by_author(
     author: str = Query(..., min_length=1, description="Autor a buscar"),
     limit: int = Query(10, ge=1, le=50, description="Número máximo de resultados")
 ):
-    """Buscar libros por autor (case insensitive)"""
-    matching_books = []
-    search_author = author.lower()
-    
-    for book in books_db.values():
-        if search_author in book["author"].lower():
-            matching_books.append(book)
-            if len(matching_books) >= limit:
-                break
-    
-    return [BookResponse(**book) for book in matching_books]
+    """Buscar libros por autor (sin distinguir mayúsculas ni acentos, todos los términos)"""
+    matching_books = books_db.get_many(author_index.search(author, limit))
+    return books_json.list_response(matching_books)
 
 # ==================== ENDPOINT ASYNC ADICIONAL ====================
 
 @app.get("/books/{book_id}/metadata")
 async def get_book_metadata_async(book_id: int):
     """Obtener metadata adicional del libro (ASYNC)"""
-    if book_id not in books_db:
+    book = books_db.get(book_id)
+    if book is None:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
     
-    book = books_db[book_id]
-    metadata = await get_book_metadata(book["title"], book["author"])
+    metadata = await get_book_metadata_cached(book["title"], book["author"])
     
     return {
         "book_info": {
@@ -259,6 +703,39 @@ async def get_book_metadata_async(book_id: int):
         "external_metadata": metadata
     }
 
+@app.post("/books/enrich")
+async def enrich_books(
+    request: BookEnrichRequest,
+    concurrency: int = Query(EXTERNAL_CONCURRENCY, ge=1, le=100, description="Llamadas externas simultáneas")
+):
+    """Validar ISBN y obtener metadata de varios libros de forma concurrente (ASYNC)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    books = []
+    not_found = []
+    for book_id in request.book_ids:
+        book = books_db.get(book_id)
+        if book is None:
+            not_found.append(book_id)
+        else:
+            books.append(book)
+    
+    # El tiempo total se acerca a la llamada más lenta, no a la suma de todas
+    results = await asyncio.gather(*(enrich_book(book, semaphore) for book in books))
+    
+    return {
+        "results": results,
+        "not_found": not_found
+    }
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Contadores de aciertos y fallos de las cachés de servicios externos"""
+    return {
+        "isbn_validation": isbn_cache.stats(),
+        "book_metadata": metadata_cache.stats()
+    }
+
 # ==================== DATOS DE EJEMPLO ====================
 
 # Función para agregar datos de ejemplo al iniciar
@@ -300,8 +777,15 @@ def add_sample_data():
         book_create = BookCreate(**book_data)
         create_book_record(book_create)
 
-# Agregar datos de ejemplo al iniciar la aplicación
-add_sample_data()
+# SEED_SAMPLE_DATA=0 arranca con la biblioteca vacía
+SEED_SAMPLE_DATA = os.getenv("SEED_SAMPLE_DATA", "1") == "1"
+
+# Se siembra al arrancar el servidor y no al importar el módulo, para que
+# importar (tests, benchmarks, cada worker) no ejecute validaciones
+@app.on_event("startup")
+def seed_sample_data():
+    if SEED_SAMPLE_DATA and not len(books_db):
+        add_sample_data()
 
 # ==================== PUNTO DE ENTRADA ====================
 
@@ -130,6 +130,52 @@ def test_async_endpoint():
         print(f"❌ Error en la prueba: {e}")
         return False
 
+def test_enrich_books():
+    """Probar enriquecimiento concurrente de varios libros"""
+    print("\n🚀 Probando enriquecimiento en lote...")
+    try:
+        books_response = requests.get(f"{BASE_URL}/books")
+        book_ids = [book["id"] for book in books_response.json()][:10]
+        if not book_ids:
+            print("⚠️  No hay libros para enriquecer")
+            return True
+        
+        start = datetime.now()
+        response = requests.post(f"{BASE_URL}/books/enrich", json={"book_ids": book_ids})
+        elapsed = (datetime.now() - start).total_seconds()
+        if response.status_code == 200:
+            results = response.json()["results"]
+            print(f"✅ {len(results)} libros enriquecidos en {elapsed:.2f}s")
+            return True
+        else:
+            print(f"❌ Error en enriquecimiento: {response.status_code}")
+            return False
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
+def test_bulk_create():
+    """Probar creación de libros en lote"""
+    print("\n📦 Probando creación en lote...")
+    books_data = [
+        {"title": f"Libro en lote {i}", "author": "Autor de prueba", "genre": "other"}
+        for i in range(5)
+    ]
+    books_data.append({"title": "", "author": "Sin título"})  # Debe fallar
+    
+    try:
+        response = requests.post(f"{BASE_URL}/books/bulk", json=books_data)
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✅ Lote procesado: {result['created']} creados, {result['failed']} con error")
+            return result["created"] == 5 and result["failed"] == 1
+        else:
+            print(f"❌ Error en creación en lote: {response.status_code}")
+            return False
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
 def run_all_tests():
     """Ejecutar todas las pruebas"""
     print("🧪 INICIANDO PRUEBAS DE LA API")
@@ -140,7 +186,9 @@ def run_all_tests():
         test_create_book,
         test_get_books,
         test_search_title,
-        test_async_endpoint
+        test_async_endpoint,
+        test_enrich_books,
+        test_bulk_create
     ]
     
     passed = 0
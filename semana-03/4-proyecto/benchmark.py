@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de rendimiento para la API de Productos - Semana 3
+Ejecutar: python benchmark.py [nombre_benchmark]
+Sin argumentos se ejecutan todos los benchmarks.
+
+No necesita el servidor corriendo: usa TestClient sobre ejemplo_main.app
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+from pydantic import ValidationError, v1 as pydantic_v1
+
+# Utilidades de medición compartidas con la Semana 2
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "recursos-compartidos" / "python"))
+import medicion
+from medicion import bytes_per_record, measure
+
+from ejemplo_main import (
+    app, products_db, JournaledStore, ProductCategory, ProductCreate, ProductRecord, ProductResponse,
+    ProductStatus, ProductUpdate, StoreJournal, create_product_record, product_from_json
+)
+
+client = TestClient(app)
+
+def ensure_products(total: int):
+    """Completar el catálogo hasta tener al menos `total` productos"""
+    for i in range(len(products_db), total):
+        create_product_record(ProductCreate(
+            name=f"producto de prueba {i}",
+            description="Generado por benchmark.py",
+            price=1 + (i * 7919) % 100_000 / 100,
+            stock=i % 50,
+            category=("electronics", "clothing", "books", "home", "sports", "other")[i % 6],
+            status=("active", "inactive", "out_of_stock")[i % 3]
+        ))
+
+# ==================== BENCHMARKS ====================
+
+# Ruta con el camino anterior: ProductResponse(**product) + validación del response_model
+@app.get("/benchmark/legacy-products", response_model=List[ProductResponse], include_in_schema=False)
+def legacy_get_products(limit: int = 100):
+    return [ProductResponse(**product) for product in products_db.values()[:limit]]
+
+def bench_list_serialization():
+    """GET /products?limit=100: modelos reconstruidos vs JSON pre-serializado"""
+    ensure_products(10_000)
+    repetitions = 200
+
+    legacy = measure(lambda: client.get("/benchmark/legacy-products?limit=100"), repetitions)
+    fast = measure(lambda: client.get("/products?limit=100"), repetitions)
+
+    assert client.get("/benchmark/legacy-products?limit=100").json() == client.get("/products?limit=100").json()
+
+    print(f"   Camino anterior:      {legacy * 1000:8.2f} ms/petición ({1 / legacy:8.0f} req/s)")
+    print(f"   JSON pre-serializado: {fast * 1000:8.2f} ms/petición ({1 / fast:8.0f} req/s)")
+    print(f"   Mejora: {legacy / fast:.1f}x")
+
+def sample_product_data(i: int) -> dict:
+    """Datos de un producto como los guarda create_product_record"""
+    now = datetime(2024, 1, 1) + timedelta(seconds=i)
+    return {
+        "name": f"Producto De Prueba {i}",
+        "description": "Generado por benchmark.py".encode().decode(),
+        "price": 1 + (i * 7919) % 100_000 / 100,
+        "stock": i % 50,
+        "category": list(ProductCategory)[i % 6],
+        "status": list(ProductStatus)[i % 3],
+        "id": i,
+        "created_at": now,
+        "updated_at": now + timedelta(microseconds=1)
+    }
+
+def bench_record_memory(total: int = 1_000_000):
+    """Bytes por producto en memoria: dict vs ProductRecord (__slots__)"""
+    as_dict = bytes_per_record(dict, sample_product_data, total)
+    compact = bytes_per_record(ProductRecord, sample_product_data, total)
+
+    print(f"   Registros medidos: {total:,}")
+    print(f"   dict por producto:    {as_dict:8.0f} bytes/registro ({as_dict * total / 2**20:8.1f} MiB)")
+    print(f"   ProductRecord:        {compact:8.0f} bytes/registro ({compact * total / 2**20:8.1f} MiB)")
+    print(f"   Ahorro: {(1 - compact / as_dict) * 100:.0f}%")
+
+def open_journaled_store(directory: str, **options) -> JournaledStore:
+    journal = StoreJournal(directory, decode=product_from_json, **options)
+    store = JournaledStore(ProductRecord, journal=journal)
+    journal.recover(store)
+    return store
+
+def bench_persistence(writes: int = 5_000, total: int = 200_000):
+    """Escrituras con log en disco (fsync por escritura vs por intervalo) y recuperación"""
+    for label, options in (
+        ("fsync por escritura", {"fsync_interval": 0}),
+        ("fsync cada 50 ms", {"fsync_interval": 0.05}),
+    ):
+        directory = tempfile.mkdtemp()
+        store = open_journaled_store(directory, snapshot_every=10 ** 9, **options)
+        start = time.perf_counter()
+        for i in range(writes):
+            store.insert(sample_product_data(i))
+        elapsed = time.perf_counter() - start
+        store._journal.close()
+        shutil.rmtree(directory)
+        print(f"   {label:<22}{elapsed / writes * 1e6:8.1f} µs/escritura ({writes / elapsed:8.0f} escrituras/s)")
+
+    directory = tempfile.mkdtemp()
+    store = open_journaled_store(directory, fsync_interval=1, snapshot_every=10 ** 9)
+    for i in range(total):
+        store.insert(sample_product_data(i))
+    start = time.perf_counter()
+    store._journal.compact()
+    compact = time.perf_counter() - start
+    for i in range(total // 10):
+        store.update(i + 1, {"stock": i})
+    store._journal.close()
+
+    start = time.perf_counter()
+    recovered = open_journaled_store(directory, fsync_interval=1)
+    recovery = time.perf_counter() - start
+    assert len(recovered) == total and recovered[1]["stock"] == 0
+    recovered._journal.close()
+    shutil.rmtree(directory)
+    print(f"   Snapshot de {total:,} productos: {compact:6.2f} s")
+    print(f"   Recuperación (snapshot + {total // 10:,} líneas de log): {recovery:6.2f} s")
+
+def bench_startup():
+    """Arranque de un worker: importación en frío + primera petición"""
+    medicion.bench_startup("/products")
+
+# Modelos con los @validator de pydantic v1, como estaban antes de la migración
+class LegacyProductCreate(pydantic_v1.BaseModel):
+    name: str = pydantic_v1.Field(..., min_length=2, max_length=100)
+    description: Optional[str] = pydantic_v1.Field(None, max_length=500)
+    price: float = pydantic_v1.Field(..., gt=0)
+    stock: int = pydantic_v1.Field(..., ge=0)
+    category: ProductCategory = ProductCategory.other
+    status: ProductStatus = ProductStatus.active
+
+    @pydantic_v1.validator("name")
+    def validate_name(cls, v):
+        cleaned = v.strip().title()
+        if len(cleaned) < 2:
+            raise ValueError("Nombre debe tener al menos 2 caracteres después de limpiar")
+        return cleaned
+
+    @pydantic_v1.validator("price")
+    def validate_price(cls, v):
+        return round(v, 2)
+
+    @pydantic_v1.validator("description")
+    def validate_description(cls, v):
+        if v is not None:
+            cleaned = v.strip()
+            return cleaned if cleaned else None
+        return v
+
+class LegacyProductUpdate(pydantic_v1.BaseModel):
+    name: Optional[str] = pydantic_v1.Field(None, min_length=2, max_length=100)
+    description: Optional[str] = pydantic_v1.Field(None, max_length=500)
+    price: Optional[float] = pydantic_v1.Field(None, gt=0)
+    stock: Optional[int] = pydantic_v1.Field(None, ge=0)
+    category: Optional[ProductCategory] = None
+    status: Optional[ProductStatus] = None
+
+    @pydantic_v1.validator("name")
+    def validate_name(cls, v):
+        if v is not None:
+            cleaned = v.strip().title()
+            if len(cleaned) < 2:
+                raise ValueError("Nombre debe tener al menos 2 caracteres")
+            return cleaned
+        return v
+
+    @pydantic_v1.validator("price")
+    def validate_price(cls, v):
+        if v is not None:
+            return round(v, 2)
+        return v
+
+CREATE_PAYLOAD = {
+    "name": "  laptop de prueba ",
+    "description": " Laptop para pruebas de rendimiento ",
+    "price": 599.999,
+    "stock": 10,
+    "category": "electronics",
+    "status": "active"
+}
+PATCH_PAYLOAD = {"name": "nombre nuevo", "price": 19.991}
+
+# Casos límite en los que ambos modelos deben aceptar o rechazar igual
+EDGE_PAYLOADS = [
+    dict(CREATE_PAYLOAD, name="  a  "),
+    dict(CREATE_PAYLOAD, name="x" * 99 + "   "),
+    dict(CREATE_PAYLOAD, description="   "),
+    dict(CREATE_PAYLOAD, description=" " * 501),
+    dict(CREATE_PAYLOAD, stock=3.7),
+    dict(CREATE_PAYLOAD, stock="4"),
+]
+
+def same_validation(legacy_validate: Callable, validate: Callable, payload: dict) -> bool:
+    """Mismo resultado, o mismos campos y mensajes propios rechazados"""
+    try:
+        legacy = legacy_validate(payload).dict(exclude_unset=True)
+    except pydantic_v1.ValidationError as error:
+        legacy = [(e["loc"], e["msg"]) for e in error.errors() if e["type"] == "value_error"]
+    try:
+        current = validate(payload).model_dump(exclude_unset=True)
+    except ValidationError as error:
+        current = [(e["loc"], e["msg"]) for e in error.errors() if e["type"] == "name_too_short"]
+    return legacy == current
+
+def bench_validation(repetitions: int = 50_000):
+    """Validación de payloads de creación y PATCH: pydantic.v1 @validator vs v2 Annotated"""
+    cases = (
+        ("crear", CREATE_PAYLOAD, LegacyProductCreate.parse_obj, ProductCreate.model_validate),
+        ("PATCH", PATCH_PAYLOAD, LegacyProductUpdate.parse_obj, ProductUpdate.model_validate),
+    )
+    for label, payload, legacy_validate, validate in cases:
+        assert same_validation(legacy_validate, validate, payload)
+        for edge in EDGE_PAYLOADS:
+            assert same_validation(legacy_validate, validate, edge), edge
+        legacy = measure(lambda: legacy_validate(payload), repetitions)
+        fast = measure(lambda: validate(payload), repetitions)
+        print(f"   {label:<6} v1 @validator: {legacy * 1e6:6.2f} µs | v2 Annotated: {fast * 1e6:6.2f} µs | "
+              f"Mejora: {legacy / fast:.1f}x")
+
+def bench_import_export(total: int = 50_000):
+    """POST /products/import (NDJSON en streaming) y GET /products/export"""
+    payload = "".join(
+        json.dumps({"name": f"importado {i}", "price": 1 + i % 1000, "stock": i % 50, "category": "books"}) + "\n"
+        for i in range(total)
+    ).encode()
+    chunks = [payload[i:i + 65536] for i in range(0, len(payload), 65536)]
+
+    start = time.perf_counter()
+    result = client.post("/products/import", content=iter(chunks), headers={"content-type": "application/x-ndjson"}).json()
+    imported = time.perf_counter() - start
+    assert result["created"] == total, result["failed"]
+    print(f"   Importación NDJSON     {total / imported:10.0f} productos/s")
+
+    for format in ("ndjson", "csv"):
+        start = time.perf_counter()
+        with client.stream("GET", f"/products/export?format={format}") as response:
+            size = sum(len(chunk) for chunk in response.iter_bytes())
+        exported = time.perf_counter() - start
+        print(f"   Exportación {format:<10} {len(products_db) / exported:10.0f} productos/s ({size / 2**20:.1f} MiB)")
+
+def bench_conditional_get(repetitions: int = 2_000):
+    """Sondeo de un producto sin cambios: GET completo vs If-None-Match (304)"""
+    ensure_products(1)
+    url = f"/products/{products_db.values()[0]['id']}"
+    etag = client.get(url).headers["ETag"]
+
+    full = measure(lambda: client.get(url), repetitions)
+    conditional = measure(lambda: client.get(url, headers={"If-None-Match": etag}), repetitions)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    print(f"   GET completo (200):   {full * 1000:8.3f} ms/petición, {len(client.get(url).content)} bytes")
+    print(f"   If-None-Match (304):  {conditional * 1000:8.3f} ms/petición, 0 bytes")
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "list_serialization": bench_list_serialization,
+    "record_memory": bench_record_memory,
+    "startup": bench_startup,
+    "validation": bench_validation,
+    "import_export": bench_import_export,
+    "conditional_get": bench_conditional_get,
+    "persistence": bench_persistence,
+}
+
+def main():
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"❌ Benchmark desconocido: {name}. Disponibles: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"\n⏱️  {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,48 @@
 # Ejemplo para Proyecto Semana 3: API de Productos con Validaciones
 # Este archivo demuestra validaciones Pydantic y manejo básico de errores
 
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel, Field, validator
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import AfterValidator, BaseModel, BeforeValidator, Field, StringConstraints, ValidationError, field_validator
+from pydantic_core import PydanticCustomError
+from typing_extensions import Annotated
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Any, AsyncIterator, Callable, Iterator
+from collections.abc import Mapping
+from contextlib import asynccontextmanager, contextmanager
 from enum import Enum
+from bisect import bisect_left, bisect_right, insort
+import base64
+import binascii
+import codecs
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Estructuras de almacenamiento compartidas con la Semana 2
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "recursos-compartidos" / "python"))
+from almacen_memoria import (
+    CompactRecord, FieldIndex, InMemoryStore, JsonCache, StoreIndex, encode_json_default, iter_batches
+)
+
+logger = logging.getLogger(__name__)
+
+# numpy es opcional y solo se importa en el modo columnar (PRODUCTS_COLUMNAR=1),
+# así no alarga el arranque de cada worker que no lo usa
+np = None
+if os.getenv("PRODUCTS_COLUMNAR", "0") == "1":
+    try:
+        import numpy as np
+    except ImportError:  # pragma: no cover - depende del entorno
+        pass
 
 # ==================== MODELOS PYDANTIC ====================
 
@@ -22,77 +59,766 @@ class ProductCategory(str, Enum):
     sports = "sports"
     other = "other"
 
-class ProductBase(BaseModel):
-    name: str = Field(..., min_length=2, max_length=100, description="Nombre del producto")
-    description: Optional[str] = Field(None, max_length=500, description="Descripción del producto")
-    price: float = Field(..., gt=0, description="Precio debe ser mayor que 0")
-    stock: int = Field(..., ge=0, description="Stock no puede ser negativo")
-    category: ProductCategory = Field(default=ProductCategory.other)
-    status: ProductStatus = Field(default=ProductStatus.active)
+class ProductSort(str, Enum):
+    id = "id"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
 
-    @validator('name')
-    def validate_name(cls, v):
-        """Capitalizar y limpiar espacios en el nombre"""
-        cleaned = v.strip().title()
+# Restricciones como tipos Annotated: las longitudes y los rangos los
+# comprueba pydantic-core en Rust; en Python solo queda la limpieza.
+# Igual que con los @validator de antes, las longitudes se miden sobre el
+# texto recibido y el mínimo del nombre se vuelve a exigir tras limpiarlo.
+def name_cleaner(message: str) -> Callable[[str], str]:
+    """Validador que limpia y capitaliza el nombre; ``message`` si queda corto"""
+    def clean_name(value: str) -> str:
+        cleaned = value.strip().title()
         if len(cleaned) < 2:
-            raise ValueError('Nombre debe tener al menos 2 caracteres después de limpiar')
+            raise PydanticCustomError("name_too_short", message)
         return cleaned
+    return clean_name
 
-    @validator('price')
-    def validate_price(cls, v):
-        """Redondear precio a 2 decimales"""
-        return round(v, 2)
+def round_price(value: float) -> float:
+    """Redondear precio a 2 decimales"""
+    return round(value, 2)
 
-    @validator('description')
-    def validate_description(cls, v):
-        """Limpiar descripción si existe"""
-        if v is not None:
-            cleaned = v.strip()
-            return cleaned if cleaned else None
-        return v
+def clean_description(value: str) -> Optional[str]:
+    """Una descripción que queda vacía después de limpiar se guarda como None"""
+    return value.strip() or None
+
+def truncate_stock(value: Any) -> Any:
+    """Aceptar stock con decimales truncándolo (3.7 -> 3), como en Pydantic v1"""
+    if isinstance(value, float) and math.isfinite(value):
+        return int(value)
+    return value
+
+ProductName = Annotated[
+    str,
+    StringConstraints(min_length=2, max_length=100),
+    AfterValidator(name_cleaner("Nombre debe tener al menos 2 caracteres después de limpiar"))
+]
+ProductNameUpdate = Annotated[
+    str,
+    StringConstraints(min_length=2, max_length=100),
+    AfterValidator(name_cleaner("Nombre debe tener al menos 2 caracteres"))
+]
+ProductDescription = Annotated[
+    str,
+    StringConstraints(max_length=500),
+    AfterValidator(clean_description)
+]
+ProductPrice = Annotated[float, Field(gt=0), AfterValidator(round_price)]
+ProductStock = Annotated[int, BeforeValidator(truncate_stock), Field(ge=0)]
+
+class ProductBase(BaseModel):
+    name: ProductName = Field(..., description="Nombre del producto")
+    description: Optional[ProductDescription] = Field(None, description="Descripción del producto")
+    price: ProductPrice = Field(..., description="Precio debe ser mayor que 0")
+    stock: ProductStock = Field(..., description="Stock no puede ser negativo")
+    category: ProductCategory = Field(default=ProductCategory.other)
+    status: ProductStatus = Field(default=ProductStatus.active)
 
 class ProductCreate(ProductBase):
     pass
 
 class ProductUpdate(BaseModel):
-    name: Optional[str] = Field(None, min_length=2, max_length=100)
+    name: Optional[ProductNameUpdate] = None
+    # Como antes, el PATCH guarda la descripción tal cual llega
     description: Optional[str] = Field(None, max_length=500)
-    price: Optional[float] = Field(None, gt=0)
-    stock: Optional[int] = Field(None, ge=0)
+    price: Optional[ProductPrice] = None
+    stock: Optional[ProductStock] = None
     category: Optional[ProductCategory] = None
     status: Optional[ProductStatus] = None
 
-    @validator('name')
-    def validate_name(cls, v):
-        if v is not None:
-            cleaned = v.strip().title()
-            if len(cleaned) < 2:
-                raise ValueError('Nombre debe tener al menos 2 caracteres')
-            return cleaned
-        return v
-
-    @validator('price')
-    def validate_price(cls, v):
-        if v is not None:
-            return round(v, 2)
-        return v
+    # Omitir un campo lo deja como está; null solo vale para la descripción
+    @field_validator("name", "price", "stock", "category", "status", mode="before")
+    @classmethod
+    def reject_null(cls, value: Any) -> Any:
+        if value is None:
+            raise PydanticCustomError("null_not_allowed", "El campo no puede ser null")
+        return value
 
 class ProductResponse(ProductBase):
     id: int
     created_at: datetime
     updated_at: datetime
 
+# ==================== ALMACENAMIENTO EN MEMORIA ====================
+
+class UniqueIndex(StoreIndex):
+    """Valor único sin distinguir mayúsculas (casefold) -> ID del registro"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._ids: Dict[str, int] = {}
+
+    def add(self, record_id: int, record: dict) -> None:
+        self._ids[record[self.field].casefold()] = record_id
+
+    def discard(self, record_id: int, record: dict) -> None:
+        key = record[self.field].casefold()
+        if self._ids.get(key) == record_id:
+            del self._ids[key]
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        if old[self.field].casefold() != new[self.field].casefold():
+            super().replace(record_id, old, new)
+
+    def find(self, value: str) -> Optional[int]:
+        return self._ids.get(value.casefold())
+
+class SortedIndex(StoreIndex):
+    """Pares (valor, ID) ordenados por valor: rangos en O(log n + k)"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._entries: List[Tuple[Any, int]] = []
+
+    def add(self, record_id: int, record: dict) -> None:
+        insort(self._entries, (record[self.field], record_id))
+
+    def discard(self, record_id: int, record: dict) -> None:
+        entry = (record[self.field], record_id)
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        if old[self.field] != new[self.field]:
+            super().replace(record_id, old, new)
+
+    def _bounds(self, low: Any, high: Any) -> Tuple[int, int]:
+        # (low,) queda antes que cualquier (low, id); (high, inf) después de todos
+        start = 0 if low is None else bisect_left(self._entries, (low,))
+        end = len(self._entries) if high is None else bisect_right(self._entries, (high, float("inf")))
+        return start, end
+
+    def count_range(self, low: Any = None, high: Any = None) -> int:
+        start, end = self._bounds(low, high)
+        return max(0, end - start)
+
+    def iter_range(
+        self,
+        low: Any = None,
+        high: Any = None,
+        after: Optional[Tuple[Any, int]] = None,
+        descending: bool = False,
+        chunk_size: int = 256
+    ) -> Iterator[Tuple[Any, int]]:
+        """Pares (valor, ID) entre low y high, continuando después de ``after``"""
+        entries = self._entries
+        lowest = None if low is None else (low,)
+        highest = None if high is None else (high, float("inf"))
+        last = after
+        while True:
+            if descending:
+                end = len(entries) if last is None else bisect_left(entries, last)
+                if highest is not None:
+                    end = min(end, bisect_right(entries, highest))
+                start = max(0, end - chunk_size)
+                chunk = entries[start:end][::-1]
+                if lowest is not None:
+                    chunk = [entry for entry in chunk if entry >= lowest]
+            else:
+                start = 0 if last is None else bisect_right(entries, last)
+                if lowest is not None:
+                    start = max(start, bisect_left(entries, lowest))
+                chunk = entries[start:start + chunk_size]
+                if highest is not None:
+                    chunk = [entry for entry in chunk if entry <= highest]
+            if not chunk:
+                return
+            yield from chunk
+            last = chunk[-1]
+
+class SummaryIndex(StoreIndex):
+    """Totales del catálogo actualizados en cada escritura.
+
+    Los precios tienen 2 decimales, así que las sumas se llevan en centavos
+    enteros y no acumulan error de punto flotante. Cada escritura publica un
+    estado nuevo, de modo que las lecturas ven siempre un resumen coherente.
+    """
+
+    def __init__(self):
+        self._state = {
+            "count": 0,
+            "price_cents": 0,
+            "value_cents": 0,
+            "categories": {},
+            "status_counts": {}
+        }
+
+    @staticmethod
+    def _apply(counts: dict, key: Any, delta: int) -> dict:
+        counts = dict(counts)
+        counts[key] = counts.get(key, 0) + delta
+        if counts[key] == 0:
+            del counts[key]
+        return counts
+
+    def _change(self, record: dict, sign: int) -> None:
+        state = self._state
+        price_cents = round(record["price"] * 100)
+        self._state = {
+            "count": state["count"] + sign,
+            "price_cents": state["price_cents"] + sign * price_cents,
+            "value_cents": state["value_cents"] + sign * price_cents * record["stock"],
+            "categories": self._apply(state["categories"], record["category"], sign),
+            "status_counts": self._apply(state["status_counts"], record["status"], sign)
+        }
+
+    def add(self, record_id: int, record: dict) -> None:
+        self._change(record, 1)
+
+    def discard(self, record_id: int, record: dict) -> None:
+        self._change(record, -1)
+
+    def summary(self) -> dict:
+        state = self._state
+        if not state["count"]:
+            return empty_summary()
+        return {
+            "total_products": state["count"],
+            "total_inventory_value": round(state["value_cents"] / 100, 2),
+            "average_price": round(state["price_cents"] / 100 / state["count"], 2),
+            "categories": dict(state["categories"]),
+            "status_counts": dict(state["status_counts"])
+        }
+
+def empty_summary() -> dict:
+    return {
+        "total_products": 0,
+        "total_value": 0,
+        "average_price": 0,
+        "categories": {},
+        "status_counts": {}
+    }
+
+def calculate_summary(products: List[dict]) -> dict:
+    """Resumen recorriendo todos los productos (referencia para verificar)"""
+    if not products:
+        return empty_summary()
+    
+    total_products = len(products)
+    total_value = sum(p["price"] * p["stock"] for p in products)
+    average_price = sum(p["price"] for p in products) / total_products
+    
+    # Contar por categorías y estados
+    categories = {}
+    status_counts = {}
+    
+    for product in products:
+        cat = product["category"]
+        categories[cat] = categories.get(cat, 0) + 1
+        
+        status = product["status"]
+        status_counts[status] = status_counts.get(status, 0) + 1
+    
+    return {
+        "total_products": total_products,
+        "total_inventory_value": round(total_value, 2),
+        "average_price": round(average_price, 2),
+        "categories": categories,
+        "status_counts": status_counts
+    }
+
+def summaries_match(aggregated: dict, scanned: dict) -> bool:
+    """Comparar resúmenes admitiendo 1 centavo de diferencia por redondeo"""
+    for key, value in scanned.items():
+        if isinstance(value, float):
+            if abs(aggregated.get(key, 0) - value) > 0.011:
+                return False
+        elif aggregated.get(key) != value:
+            return False
+    return True
+
+CATEGORY_CODES = {category: code for code, category in enumerate(ProductCategory)}
+STATUS_CODES = {status: code for code, status in enumerate(ProductStatus)}
+
+class ColumnarIndex(StoreIndex):
+    """Copia columnar del catálogo en arreglos NumPy para análisis vectorizado.
+
+    Cada producto ocupa un "slot" (fila) en columnas de ID, precio, stock y
+    códigos de categoría y estado. Los slots se asignan en orden de inserción,
+    que coincide con el orden de IDs; al borrar se marca el slot como libre y
+    las columnas se compactan cuando la mitad está vacía.
+    """
+
+    COLUMNS = {
+        "id": "int64",
+        "price": "float64",
+        "stock": "int64",
+        "category": "int8",
+        "status": "int8",
+        "valid": "bool"
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self._slots: Dict[int, int] = {}
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+
+    @staticmethod
+    def _row(record_id: int, record: dict) -> Dict[str, Any]:
+        # Convertir antes de escribir: un valor inválido no deja la fila a medias
+        return {
+            "id": record_id,
+            "price": float(record["price"]),
+            "stock": int(record["stock"]),
+            "category": CATEGORY_CODES[record["category"]],
+            "status": STATUS_CODES[record["status"]],
+            "valid": True
+        }
+
+    def _write(self, slot: int, row: Dict[str, Any]) -> None:
+        columns = self._columns
+        for name, value in row.items():
+            columns[name][slot] = value
+
+    def add(self, record_id: int, record: dict) -> None:
+        row = self._row(record_id, record)
+        if self._size == len(self._columns["id"]):
+            self._columns = {
+                name: np.concatenate([column, np.zeros(len(column), dtype=column.dtype)])
+                for name, column in self._columns.items()
+            }
+        self._slots[record_id] = self._size
+        self._write(self._size, row)
+        self._size += 1
+
+    def discard(self, record_id: int, record: dict) -> None:
+        slot = self._slots.pop(record_id, None)
+        if slot is not None:
+            self._columns["valid"][slot] = False
+            if len(self._slots) < self._size // 2:
+                self._compact()
+
+    def replace(self, record_id: int, old: dict, new: dict) -> None:
+        self._write(self._slots[record_id], self._row(record_id, new))
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self._columns["valid"][:self._size])
+        capacity = max(1024, len(keep) * 2)
+        columns = {}
+        for name, column in self._columns.items():
+            compacted = np.zeros(capacity, dtype=column.dtype)
+            compacted[:len(keep)] = column[keep]
+            columns[name] = compacted
+        self._slots = {int(record_id): slot for slot, record_id in enumerate(columns["id"][:len(keep)])}
+        self._size = len(keep)
+        # Publicar las columnas nuevas en una sola asignación
+        self._columns = columns
+
+    def _view(self) -> Dict[str, Any]:
+        columns = self._columns
+        size = min(self._size, len(columns["id"]))
+        return {name: column[:size] for name, column in columns.items()}
+
+    def _mask(
+        self,
+        view: Dict[str, Any],
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        category: Optional[ProductCategory] = None,
+        status: Optional[ProductStatus] = None
+    ):
+        mask = view["valid"].copy()
+        if min_price is not None:
+            mask &= view["price"] >= min_price
+        if max_price is not None:
+            mask &= view["price"] <= max_price
+        if category is not None:
+            mask &= view["category"] == CATEGORY_CODES[category]
+        if status is not None:
+            mask &= view["status"] == STATUS_CODES[status]
+        return mask
+
+    def filter_ids(self, after_id: Optional[int] = None, **filters) -> List[int]:
+        """IDs ascendentes que cumplen los filtros, calculados de forma vectorizada"""
+        view = self._view()
+        mask = self._mask(view, **filters)
+        if after_id is not None:
+            mask &= view["id"] > after_id
+        return view["id"][mask].tolist()
+
+    def values(self, field: str, **filters):
+        view = self._view()
+        return view[field][self._mask(view, **filters)]
+
+# Modo columnar opcional para catálogos de millones de productos
+COLUMNAR_ENABLED = os.getenv("PRODUCTS_COLUMNAR", "0") == "1" and np is not None
+
+class ProductRecord(CompactRecord):
+    __slots__ = ("name", "description", "price", "stock", "category", "status", "id", "_created_at", "_updated_at")
+    KEYS = tuple(ProductResponse.model_fields)
+    ENUMS = {"category": ProductCategory, "status": ProductStatus}
+
+class JournaledStore(InMemoryStore):
+    """Almacén de productos que anota cada escritura en un ``StoreJournal``.
+
+    Con ``journal`` cada escritura se anota en el log de disco antes de
+    responder; sin él se comporta como ``InMemoryStore``.
+    """
+
+    def __init__(self, record_type: Callable[[dict], Mapping] = dict, journal: Optional["StoreJournal"] = None):
+        super().__init__(record_type)
+        self._journal = journal
+        self._write_depth = 0
+
+    def restore(self, record_id: int, data: Optional[dict]) -> None:
+        """Aplicar una entrada leída del disco sin anotarla (``None`` = borrado).
+
+        Si el registro no es válido lanza la excepción y el anterior queda
+        como estaba.
+        """
+        with self.lock:
+            record = None if data is None else self._record_type(data)
+            current = self._records.get(record_id)
+            if current is not None or record is not None:
+                self._publish(record_id, current, record, log=False)
+
+    def reserve_ids(self, last_id: int) -> None:
+        """No volver a entregar IDs hasta ``last_id`` (el disco recuerda los borrados)"""
+        with self.lock:
+            self._ids.advance(max(last_id, max(self._records, default=0)))
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Bloque de escrituras atómico (toma ``lock``).
+
+        Con log en disco, el fsync se espera una sola vez al salir del bloque
+        más externo y ya sin el lock, para que otros hilos sigan escribiendo
+        y compartan ese fsync.
+        """
+        with self.lock:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                outermost = self._write_depth == 0
+                sequence = self._journal.last_sequence if self._journal is not None else 0
+        if outermost and self._journal is not None:
+            self._journal.wait_durable(sequence)
+
+    def _log_put(self, record: Mapping) -> None:
+        if self._journal is not None:
+            self._journal.put(record)
+
+    def _log_delete(self, record_id: int) -> None:
+        if self._journal is not None:
+            self._journal.delete(record_id)
+
+# ==================== PERSISTENCIA ====================
+
+class StoreJournal:
+    """Persistencia del almacén: snapshot compactado + log de escrituras.
+
+    Cada escritura agrega una línea JSON a ``journal.log`` (``{"put": {...}}``
+    o ``{"delete": id}``), así que escribir cuesta un append. Al arrancar se
+    carga ``snapshot.jsonl`` y se reproduce el log encima.
+
+    ``fsync_interval`` controla la durabilidad:
+
+    - ``0``: cada escritura espera su fsync. Es un group commit: quien llega
+      al fsync sincroniza también las líneas de los demás hilos, que ya no
+      necesitan el suyo.
+    - ``> 0``: un hilo hace fsync cada ``fsync_interval`` segundos y las
+      escrituras no esperan. Un corte de luz puede perder ese intervalo;
+      una caída del proceso no, porque las líneas ya están en el SO.
+
+    Cada ``snapshot_every`` líneas se compacta en segundo plano: se rota el
+    log, se escribe el snapshot nuevo en un temporal que reemplaza al
+    anterior con ``os.replace`` y se borra el log rotado. La primera línea
+    del snapshot (``{"next_id": n}``) guarda el primer ID libre, para no
+    repetir los IDs de productos borrados tras reiniciar.
+    """
+
+    SNAPSHOT = "snapshot.jsonl"
+    LOG = "journal.log"
+    ROTATED_LOG = "journal.old.log"
+
+    # json.dumps con opciones crea un encoder por llamada; este se reutiliza
+    _encoder = json.JSONEncoder(default=encode_json_default, ensure_ascii=False, separators=(",", ":"))
+    _decode_line = json.JSONDecoder().decode
+
+    def __init__(
+        self,
+        directory: str,
+        decode: Callable[[dict], dict] = dict,
+        fsync_interval: float = 0,
+        snapshot_every: int = 100_000
+    ):
+        self.directory = directory
+        self.decode = decode
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self._store: Optional[JournaledStore] = None
+        self._file = None
+        self._log_size = 0  # Bytes válidos en el log actual
+        self._sync_thread: Optional[threading.Thread] = None
+        self._written = 0  # Secuencia de la última línea escrita
+        self._synced = 0   # Secuencia de la última línea con fsync
+        self._entries = 0  # Líneas en el log actual
+        self._sync_lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self._compaction_scheduled = False
+        self._closed = threading.Event()
+        self.skipped = 0  # Entradas omitidas en la última recuperación
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # ---------- Recuperación ----------
+
+    def recover(self, store: "JournaledStore") -> int:
+        """Cargar snapshot + logs en ``store`` y abrir el log; devuelve cuántos productos hay"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._closed.clear()
+        with self._sync_lock:
+            # Una segunda recuperación vuelve a leer el log desde el principio
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._entries = 0
+        self.skipped = 0
+        last_id = 0  # Mayor ID visto, incluidos los borrados
+        snapshot_path = self._path(self.SNAPSHOT)
+        with store.lock:
+            if os.path.exists(snapshot_path):
+                with open(snapshot_path, encoding="utf-8") as snapshot:
+                    for line in snapshot:
+                        data = self._decode_line(line)
+                        if "next_id" in data:
+                            last_id = max(last_id, data["next_id"] - 1)
+                        else:
+                            self._restore(store, {"put": data})
+            # Un log rotado que sigue en disco es de una compactación que no
+            # terminó; sus líneas son idempotentes, así que se reproduce igual
+            rotated = os.path.exists(self._path(self.ROTATED_LOG))
+            for name in (self.ROTATED_LOG, self.LOG):
+                if os.path.exists(self._path(name)):
+                    last_id = max(last_id, self._replay(self._path(name), store))
+            store.reserve_ids(last_id)
+        if self.skipped:
+            logger.warning("%d entradas de %s no se pudieron cargar y se omitieron", self.skipped, self.directory)
+        self._store = store
+        if rotated:
+            # Terminar esa compactación antes de que otra rote el log encima
+            self._write_snapshot(store.values(), store.next_id)
+            os.remove(self._path(self.ROTATED_LOG))
+            open(self._path(self.LOG), "wb").close()
+            self._entries = 0
+        self._open_log()
+        if self.fsync_interval > 0 and (self._sync_thread is None or not self._sync_thread.is_alive()):
+            self._sync_thread = threading.Thread(target=self._sync_periodically, daemon=True)
+            self._sync_thread.start()
+        return len(store)
+
+    def _restore(self, store: "JournaledStore", entry: dict) -> int:
+        """Aplicar una entrada ``{"put": {...}}`` o ``{"delete": id}``; devuelve su ID.
+
+        Una entrada que no se puede decodificar o que el almacén rechaza
+        (p. ej. un null que pasó la validación) se informa y se omite: ese
+        registro queda en su versión anterior y el resto se sigue cargando.
+        """
+        record_id = 0
+        try:
+            if "put" in entry:
+                record_id = entry["put"]["id"]
+                store.restore(record_id, self.decode(entry["put"]))
+            else:
+                record_id = entry["delete"]
+                store.restore(record_id, None)
+        except (AttributeError, KeyError, TypeError, ValueError) as error:
+            self.skipped += 1
+            logger.warning("Entrada omitida al recuperar %s (ID %s): %r", self.directory, record_id, error)
+        return record_id
+
+    def _replay(self, path: str, store: "JournaledStore") -> int:
+        """Aplicar un log sobre ``store``; devuelve el mayor ID que aparece"""
+        last_id = 0
+        valid_bytes = 0
+        with open(path, "rb") as log:
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("línea incompleta")
+                    entry = self._decode_line(line.decode("utf-8"))
+                except ValueError:
+                    # Escritura cortada por una caída: se descarta la cola
+                    break
+                last_id = max(last_id, self._restore(store, entry))
+                valid_bytes += len(line)
+                self._entries += 1
+        if valid_bytes < os.path.getsize(path):
+            os.truncate(path, valid_bytes)
+        return last_id
+
+    # ---------- Escritura ----------
+
+    def encode(self, record: Mapping) -> bytes:
+        return self._encoder.encode(dict(record)).encode("utf-8")
+
+    def _open_log(self):
+        """Abrir el log si hace falta (también sin recover(), p. ej. un almacén nuevo)"""
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Sin buffer: un error de disco aparece aquí y no en un flush posterior
+            self._file = open(self._path(self.LOG), "ab", buffering=0)
+            self._log_size = self._file.seek(0, os.SEEK_END)
+        return self._file
+
+    def _append(self, line: bytes) -> int:
+        """Agregar una línea al log (con el lock del almacén tomado).
+
+        Si la escritura falla, el log se recorta a la última línea completa
+        y el error se propaga: el almacén deshace los índices y no publica
+        el registro.
+        """
+        log = self._open_log()
+        try:
+            written = 0
+            while written < len(line):
+                written += log.write(line[written:])
+        except OSError:
+            # Media línea pegada a la siguiente invalidaría el resto del log
+            log.truncate(self._log_size)
+            raise
+        self._log_size += len(line)
+        self._written += 1
+        self._entries += 1
+        # Compactar necesita el almacén, que se conoce a partir de recover()
+        if self._entries >= self.snapshot_every and not self._compaction_scheduled and self._store is not None:
+            self._compaction_scheduled = True
+            threading.Thread(target=self.compact, daemon=True).start()
+        return self._written
+
+    def put(self, record: Mapping) -> int:
+        return self._append(b'{"put":' + self.encode(record) + b"}\n")
+
+    def delete(self, record_id: int) -> int:
+        return self._append(b'{"delete":%d}\n' % record_id)
+
+    def sync(self) -> None:
+        """Volcar al SO y hacer fsync de todo lo escrito hasta ahora"""
+        with self._sync_lock:
+            target = self._written
+            if self._synced >= target or self._file is None:
+                return
+            os.fsync(self._file.fileno())
+            self._synced = target
+
+    @property
+    def last_sequence(self) -> int:
+        return self._written
+
+    def wait_durable(self, sequence: int) -> None:
+        if self.fsync_interval > 0:
+            return
+        if self._synced < sequence:
+            self.sync()
+
+    def _sync_periodically(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            self.sync()
+
+    # ---------- Compactación ----------
+
+    def compact(self) -> None:
+        """Escribir un snapshot con el estado actual y vaciar el log"""
+        with self._compacting:
+            with self._store.lock:
+                # Los registros son inmutables: basta copiar la lista
+                records = self._store.values()
+                next_id = self._store.next_id
+                with self._sync_lock:
+                    log = self._open_log()
+                    os.fsync(log.fileno())
+                    self._synced = self._written
+                    log.close()
+                    self._file = None
+                    os.replace(self._path(self.LOG), self._path(self.ROTATED_LOG))
+                    self._open_log()
+                    self._entries = 0
+                self._compaction_scheduled = False
+
+            self._write_snapshot(records, next_id)
+            os.remove(self._path(self.ROTATED_LOG))
+
+    def _write_snapshot(self, records: List[Mapping], next_id: int) -> None:
+        temporary = self._path(self.SNAPSHOT + ".tmp")
+        with open(temporary, "wb") as snapshot:
+            snapshot.write(b'{"next_id":%d}\n' % next_id)
+            for record in records:
+                snapshot.write(self.encode(record) + b"\n")
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary, self._path(self.SNAPSHOT))
+        self._fsync_directory()
+
+    def _fsync_directory(self) -> None:
+        # Hace durable el os.replace; Windows no permite abrir directorios
+        if os.name == "nt":
+            return
+        descriptor = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._compacting:
+            self.sync()
+        with self._sync_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
 # ==================== CONFIGURACIÓN FASTAPI ====================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cargar el catálogo al arrancar y cerrar el log de escrituras al apagar"""
+    load_products()
+    yield
+    if products_journal is not None:
+        products_journal.close()
+
 app = FastAPI(
     title="API de Productos - Semana 3",
     description="API para gestión de productos con validaciones Pydantic y manejo de errores",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+def product_from_json(data: dict) -> dict:
+    """Producto leído del disco: las fechas vuelven a ser datetime"""
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    data["updated_at"] = datetime.fromisoformat(data["updated_at"])
+    return data
+
+# Persistencia opcional: snapshot + log en PRODUCTS_DATA_DIR
+PRODUCTS_DATA_DIR = os.getenv("PRODUCTS_DATA_DIR")
+products_journal = StoreJournal(
+    PRODUCTS_DATA_DIR,
+    decode=product_from_json,
+    fsync_interval=float(os.getenv("PRODUCTS_FSYNC_INTERVAL", "0")),
+    snapshot_every=int(os.getenv("PRODUCTS_SNAPSHOT_EVERY", "100000"))
+) if PRODUCTS_DATA_DIR else None
+
 # Base de datos en memoria
-products_db: Dict[int, dict] = {}
-next_id: int = 1
+products_db = JournaledStore(ProductRecord, journal=products_journal)
+name_index = products_db.add_index(UniqueIndex("name"))
+id_order = products_db.add_index(SortedIndex("id"))
+price_index = products_db.add_index(SortedIndex("price"))
+category_index = products_db.add_index(FieldIndex("category"))
+status_index = products_db.add_index(FieldIndex("status"))
+summary_index = products_db.add_index(SummaryIndex())
+columnar_index = products_db.add_index(ColumnarIndex()) if COLUMNAR_ENABLED else None
+products_json = products_db.add_index(JsonCache(
+    products_db, list(ProductResponse.model_fields), max_entries=int(os.getenv("JSON_CACHE_SIZE", "100000"))
+))
 
 # ==================== FUNCIONES AUXILIARES ====================
 
@@ -113,25 +839,272 @@ def validation_error(message: str):
         detail=message
     )
 
+def body_etag(body: bytes) -> str:
+    """ETag fuerte a partir de los bytes exactos de la respuesta"""
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def product_etag(product: dict) -> str:
+    """ETag del JSON del producto.
+
+    Sale del cuerpo y no de un contador por registro: tras reiniciar o
+    reutilizar un ID, el contador puede repetirse con otro contenido y
+    daría un 304 o un If-Match válido que no corresponden. El JSON ya está en caché, así
+    que solo se paga el hash.
+    """
+    return body_etag(products_json.encode(product))
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = False) -> bool:
+    """Si la lista de If-Match / If-None-Match incluye ``etag`` o es ``*``.
+
+    If-None-Match usa la comparación débil (ignora el prefijo W/); If-Match,
+    la fuerte, donde un ETag débil nunca coincide.
+    """
+    if header is None:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if weak and tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+def check_if_match(if_match: Optional[str], product: dict):
+    """Rechazar la escritura si el cliente editó una versión que ya cambió"""
+    if if_match is not None and not etag_matches(if_match, product_etag(product)):
+        raise HTTPException(
+            status_code=412,
+            detail=f"El producto {product['id']} cambió desde que se leyó; vuelve a obtenerlo"
+        )
+
+def product_response(product: dict, status_code: int = 200) -> Response:
+    body = products_json.encode(product)
+    return Response(
+        content=body, status_code=status_code, media_type="application/json",
+        headers={"ETag": body_etag(body)}
+    )
+
 def create_product_record(product_data: ProductCreate) -> dict:
     """Crear registro de producto con timestamp"""
-    global next_id
-    
-    # Verificar si ya existe un producto con el mismo nombre (bonus)
-    for existing_product in products_db.values():
-        if existing_product["name"].lower() == product_data.name.lower():
-            validation_error(f"Ya existe un producto con el nombre '{product_data.name}'")
-    
-    product_dict = product_data.dict()
+    product_dict = product_data.model_dump()
     product_dict.update({
-        "id": next_id,
         "created_at": get_current_time(),
         "updated_at": get_current_time()
     })
     
-    products_db[next_id] = product_dict
-    next_id += 1
-    return product_dict
+    with products_db.write():
+        # Verificar si ya existe un producto con el mismo nombre (bonus)
+        if name_index.find(product_data.name) is not None:
+            validation_error(f"Ya existe un producto con el nombre '{product_data.name}'")
+        
+        return products_db.insert(product_dict)
+
+def is_json_int(value: Any) -> bool:
+    # bool es subclase de int, pero true/false no son IDs
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def encode_cursor(sort: ProductSort, key: Tuple[Any, int]) -> str:
+    """Cursor opaco con la posición del último producto de la página"""
+    raw = json.dumps([sort.value, *key]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str, sort: ProductSort) -> Tuple[Any, int]:
+    try:
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        validation_error("Cursor inválido")
+    if cursor_sort != sort.value:
+        validation_error("El cursor pertenece a otro orden de resultados")
+    # Los índices comparan con bisect: un tipo distinto acabaría en un error 500
+    if not is_json_int(product_id):
+        validation_error("Cursor inválido")
+    if sort == ProductSort.id:
+        valid_value = is_json_int(value)
+    else:
+        valid_value = (is_json_int(value) or isinstance(value, float)) and math.isfinite(value)
+    if not valid_value:
+        validation_error("Cursor inválido")
+    return value, product_id
+
+def iter_product_candidates(
+    sort: ProductSort,
+    min_price: Optional[float],
+    max_price: Optional[float],
+    filters: List[Tuple[FieldIndex, Any]],
+    after: Optional[Tuple[Any, int]]
+) -> Iterator[Tuple[Tuple[Any, int], int]]:
+    """Pares (clave del cursor, ID) en el orden pedido, desde el índice más selectivo.
+
+    Los candidatos pueden no cumplir todos los filtros: se verifican después.
+    """
+    if sort != ProductSort.id:
+        # El índice de precios ya entrega el orden pedido y aplica el rango
+        descending = sort == ProductSort.price_desc
+        for entry in price_index.iter_range(min_price, max_price, after, descending):
+            yield entry, entry[1]
+        return
+    
+    after_id = None if after is None else after[1]
+    if columnar_index is not None:
+        # Modo columnar: todos los filtros se evalúan como una sola máscara
+        filter_values = {index.field: value for index, value in filters}
+        for product_id in columnar_index.filter_ids(
+            after_id, min_price=min_price, max_price=max_price, **filter_values
+        ):
+            yield (product_id, product_id), product_id
+        return
+    
+    has_price_range = min_price is not None or max_price is not None
+    price_count = price_index.count_range(min_price, max_price) if has_price_range else len(products_db)
+    field_counts = [(index.count(value), index, value) for index, value in filters]
+    
+    best_field = min(field_counts, key=lambda item: item[0]) if field_counts else None
+    if best_field is not None and best_field[0] <= price_count:
+        _, index, value = best_field
+        for product_id in index.iter_ids(value, after_id):
+            yield (product_id, product_id), product_id
+    elif has_price_range:
+        # Rango de precios más selectivo: se materializa y ordena por ID (k elementos)
+        ids = sorted(product_id for _, product_id in price_index.iter_range(min_price, max_price))
+        for product_id in ids[bisect_right(ids, after_id if after_id is not None else -1):]:
+            yield (product_id, product_id), product_id
+    else:
+        for product_id, _ in id_order.iter_range(after=after):
+            yield (product_id, product_id), product_id
+
+# ==================== IMPORTACIÓN Y EXPORTACIÓN ====================
+
+# Filas que se validan y guardan juntas (un solo fsync por lote con log en disco)
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+# Productos por fragmento de la exportación
+EXPORT_CHUNK_SIZE = 1000
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+# (línea, fila, error de lectura)
+ImportRow = Tuple[int, Any, Optional[str]]
+
+async def iter_request_lines(request: Request) -> AsyncIterator[str]:
+    """Líneas del cuerpo a medida que llega, sin leerlo completo"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    try:
+        async for chunk in request.stream():
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El archivo debe estar en UTF-8")
+    if pending:
+        yield pending
+
+async def iter_ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[ImportRow]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError:
+            yield line_number, None, "Línea NDJSON inválida"
+
+async def iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[ImportRow]:
+    """Filas CSV con encabezado; las celdas vacías se omiten para usar los valores por defecto.
+
+    Un registro entre comillas puede ocupar varias líneas: se junta hasta que
+    la cantidad de comillas sea par.
+    """
+    header = None
+    record, start_line, line_number = "", 0, 0
+    async for line in lines:
+        line_number += 1
+        if not record:
+            if not line.strip():
+                continue
+            start_line = line_number
+        record += line + "\n"
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record])), ""
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield start_line, None, f"Se esperaban {len(header)} columnas y hay {len(values)}"
+        else:
+            yield start_line, {name: value for name, value in zip(header, values) if value != ""}, None
+    if record:
+        yield start_line, None, "Comillas sin cerrar al final del archivo"
+
+def import_error(line: int, errors: Any) -> dict:
+    return {"line": line, "errors": errors}
+
+def import_products_batch(batch: List[ImportRow]) -> Tuple[int, List[dict]]:
+    """Validar un lote y guardar los productos válidos; devuelve (creados, errores)"""
+    errors = []
+    valid = []
+    for line, item, read_error in batch:
+        if read_error:
+            errors.append(import_error(line, read_error))
+            continue
+        try:
+            valid.append((line, ProductCreate.model_validate(item)))
+        except ValidationError as error:
+            errors.append(import_error(line, error.errors(include_url=False)))
+    
+    now = get_current_time()
+    created = 0
+    with products_db.write():
+        for line, product in valid:
+            if name_index.find(product.name) is not None:
+                errors.append(import_error(line, f"Ya existe un producto con el nombre '{product.name}'"))
+                continue
+            products_db.insert(dict(product.model_dump(), created_at=now, updated_at=now))
+            created += 1
+    
+    errors.sort(key=lambda error: error["line"])
+    return created, errors
+
+def iter_export_records() -> Iterator[List[dict]]:
+    """Productos en orden de ID, en fragmentos, leyendo el índice a medida que avanza"""
+    chunk = []
+    for _, product_id in id_order.iter_range():
+        product = products_db.get(product_id)
+        if product is None:
+            continue
+        chunk.append(product)
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_ndjson() -> Iterator[bytes]:
+    for chunk in iter_export_records():
+        yield b"".join(products_json.encode(product, store=False) + b"\n" for product in chunk)
+
+def csv_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def export_csv() -> Iterator[str]:
+    fields = products_json.fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(fields)
+    for chunk in iter_export_records():
+        writer.writerows([csv_value(product[field]) for field in fields] for product in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
 
 # ==================== ENDPOINTS ====================
 
@@ -157,7 +1130,7 @@ def read_root():
 def create_product(product: ProductCreate):
     """Crear un nuevo producto"""
     product_record = create_product_record(product)
-    return ProductResponse(**product_record)
+    return product_response(product_record, status_code=201)
 
 @app.get("/products", response_model=List[ProductResponse])
 def get_products(
@@ -165,94 +1138,143 @@ def get_products(
     max_price: Optional[float] = Query(None, ge=0, description="Precio máximo"),
     category: Optional[ProductCategory] = Query(None, description="Filtrar por categoría"),
     status: Optional[ProductStatus] = Query(None, description="Filtrar por estado"),
+    sort: ProductSort = Query(ProductSort.id, description="Orden: id, price_asc o price_desc"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
     limit: int = Query(20, ge=1, le=100, description="Límite de resultados")
 ):
-    """Listar productos con filtros opcionales"""
-    products = list(products_db.values())
-    
-    # Aplicar filtros
-    if min_price is not None:
-        products = [p for p in products if p["price"] >= min_price]
-    
-    if max_price is not None:
-        products = [p for p in products if p["price"] <= max_price]
+    """Listar productos con filtros opcionales, ordenados y paginados por cursor"""
+    # Validar rango de precios antes de buscar
+    if min_price is not None and max_price is not None and min_price > max_price:
+        validation_error("El precio mínimo no puede ser mayor que el precio máximo")
     
+    after = decode_cursor(cursor, sort) if cursor else None
+    filters = []
     if category is not None:
-        products = [p for p in products if p["category"] == category]
-    
+        filters.append((category_index, category))
     if status is not None:
-        products = [p for p in products if p["status"] == status]
+        filters.append((status_index, status))
     
-    # Validar rango de precios
-    if min_price is not None and max_price is not None and min_price > max_price:
-        validation_error("El precio mínimo no puede ser mayor que el precio máximo")
+    products = []
+    last_key = next_key = None
+    for key, product_id in iter_product_candidates(sort, min_price, max_price, filters, after):
+        product = products_db.get(product_id)
+        if product is None:
+            continue
+        if min_price is not None and product["price"] < min_price:
+            continue
+        if max_price is not None and product["price"] > max_price:
+            continue
+        if any(product[index.field] != value for index, value in filters):
+            continue
+        
+        if len(products) == limit:
+            # Hay al menos un producto más: la página siguiente empieza aquí
+            next_key = last_key
+            break
+        products.append(product)
+        last_key = key
+    
+    # Los registros ya están validados: se envían sin reconstruir ProductResponse
+    json_response = products_json.list_response(products)
+    if next_key is not None:
+        json_response.headers["X-Next-Cursor"] = encode_cursor(sort, next_key)
+    return json_response
+
+# Antes de /products/{product_id} para que "export" no se lea como un ID
+@app.get("/products/export")
+def export_products(format: ExportFormat = ExportFormat.ndjson):
+    """Exportar el catálogo completo como NDJSON o CSV, en streaming"""
+    if format == ExportFormat.csv:
+        return StreamingResponse(
+            export_csv(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": "attachment; filename=products.csv"}
+        )
+    return StreamingResponse(export_ndjson(), media_type="application/x-ndjson")
+
+@app.post("/products/import")
+async def import_products(request: Request):
+    """Importar productos desde NDJSON o CSV (según Content-Type), en lotes"""
+    lines = iter_request_lines(request)
+    if "csv" in request.headers.get("content-type", ""):
+        rows = iter_csv_rows(lines)
+    else:
+        rows = iter_ndjson_rows(lines)
     
-    # Limitar resultados
-    products = products[:limit]
+    created = 0
+    errors = []
+    async for batch in iter_batches(rows, BULK_BATCH_SIZE):
+        # Validar y guardar bloquea: se hace fuera del event loop
+        batch_created, batch_errors = await run_in_threadpool(import_products_batch, batch)
+        created += batch_created
+        errors.extend(batch_errors)
     
-    return [ProductResponse(**product) for product in products]
+    return {"created": created, "failed": len(errors), "errors": errors}
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int):
-    """Obtener un producto específico por ID"""
-    if product_id not in products_db:
+def get_product(product_id: int, if_none_match: Optional[str] = Header(None)):
+    """Obtener un producto específico por ID (304 si el cliente ya tiene esta versión)"""
+    product = products_db.get(product_id)
+    if product is None:
         product_not_found(product_id)
     
-    return ProductResponse(**products_db[product_id])
+    etag = product_etag(product)
+    if etag_matches(if_none_match, etag, weak=True):
+        return Response(status_code=304, headers={"ETag": etag})
+    return product_response(product)
 
 @app.put("/products/{product_id}", response_model=ProductResponse)
-def update_product(product_id: int, product: ProductCreate):
-    """Actualizar un producto completamente"""
-    if product_id not in products_db:
-        product_not_found(product_id)
+def update_product(product_id: int, product: ProductCreate, if_match: Optional[str] = Header(None)):
+    """Actualizar un producto completamente (If-Match evita pisar cambios ajenos)"""
+    # Actualizar con todos los datos nuevos (se conservan id y created_at)
+    updated_data = product.model_dump()
+    updated_data["updated_at"] = get_current_time()
     
-    # Verificar nombre único excluyendo el producto actual
-    for existing_id, existing_product in products_db.items():
-        if (existing_id != product_id and 
-            existing_product["name"].lower() == product.name.lower()):
+    with products_db.write():
+        current = products_db.get(product_id)
+        if current is None:
+            product_not_found(product_id)
+        check_if_match(if_match, current)
+        
+        # Verificar nombre único excluyendo el producto actual
+        existing_id = name_index.find(product.name)
+        if existing_id is not None and existing_id != product_id:
             validation_error(f"Ya existe otro producto con el nombre '{product.name}'")
+        
+        updated_product = products_db.update(product_id, updated_data)
     
-    # Actualizar con todos los datos nuevos
-    updated_data = product.dict()
-    updated_data.update({
-        "id": product_id,
-        "created_at": products_db[product_id]["created_at"],
-        "updated_at": get_current_time()
-    })
-    
-    products_db[product_id] = updated_data
-    return ProductResponse(**updated_data)
+    return product_response(updated_product)
 
 @app.patch("/products/{product_id}", response_model=ProductResponse)
-def update_product_partial(product_id: int, product: ProductUpdate):
-    """Actualizar un producto parcialmente"""
-    if product_id not in products_db:
-        product_not_found(product_id)
-    
-    # Verificar nombre único si se está actualizando
-    if product.name is not None:
-        for existing_id, existing_product in products_db.items():
-            if (existing_id != product_id and 
-                existing_product["name"].lower() == product.name.lower()):
-                validation_error(f"Ya existe otro producto con el nombre '{product.name}'")
-    
+def update_product_partial(product_id: int, product: ProductUpdate, if_match: Optional[str] = Header(None)):
+    """Actualizar un producto parcialmente (If-Match evita pisar cambios ajenos)"""
     # Actualizar solo los campos proporcionados
-    current_product = products_db[product_id].copy()
-    update_data = product.dict(exclude_unset=True)
+    update_data = product.model_dump(exclude_unset=True)
+    update_data["updated_at"] = get_current_time()
     
-    current_product.update(update_data)
-    current_product["updated_at"] = get_current_time()
+    with products_db.write():
+        current = products_db.get(product_id)
+        if current is None:
+            product_not_found(product_id)
+        check_if_match(if_match, current)
+        
+        # Verificar nombre único si se está actualizando
+        if product.name is not None:
+            existing_id = name_index.find(product.name)
+            if existing_id is not None and existing_id != product_id:
+                validation_error(f"Ya existe otro producto con el nombre '{product.name}'")
+        
+        updated_product = products_db.update(product_id, update_data)
     
-    products_db[product_id] = current_product
-    return ProductResponse(**current_product)
+    return product_response(updated_product)
 
 @app.delete("/products/{product_id}")
 def delete_product(product_id: int):
     """Eliminar un producto (BONUS)"""
-    if product_id not in products_db:
+    deleted_product = products_db.pop(product_id)
+    if deleted_product is None:
         product_not_found(product_id)
     
-    deleted_product = products_db.pop(product_id)
     return {
         "message": f"Producto '{deleted_product['name']}' eliminado correctamente",
         "deleted_product": {
@@ -265,47 +1287,83 @@ def delete_product(product_id: int):
 # ==================== ENDPOINTS ADICIONALES (BONUS) ====================
 
 @app.get("/products/stats/summary")
-def get_products_summary():
+def get_products_summary(
+    verify: bool = Query(False, description="Recalcular recorriendo el catálogo y comparar (pruebas)")
+):
     """Obtener resumen estadístico de productos (BONUS)"""
-    if not products_db:
-        return {
-            "total_products": 0,
-            "total_value": 0,
-            "average_price": 0,
-            "categories": {},
-            "status_counts": {}
-        }
+    # Los totales se mantienen en cada escritura: O(1)
+    summary = summary_index.summary()
     
-    total_products = len(products_db)
-    total_value = sum(p["price"] * p["stock"] for p in products_db.values())
-    average_price = sum(p["price"] for p in products_db.values()) / total_products
+    if verify:
+        with products_db.lock:
+            summary = summary_index.summary()
+            scanned = calculate_summary(products_db.values())
+        summary["consistent"] = summaries_match(summary, scanned)
     
-    # Contar por categorías
-    categories = {}
-    status_counts = {}
+    return summary
+
+class StatsField(str, Enum):
+    price = "price"
+    stock = "stock"
+
+def require_columnar():
+    if columnar_index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Disponible solo en modo columnar: instala numpy y define PRODUCTS_COLUMNAR=1"
+        )
+
+@app.get("/products/stats/percentiles")
+def get_products_percentiles(
+    field: StatsField = Query(StatsField.price, description="Campo a analizar"),
+    category: Optional[ProductCategory] = Query(None, description="Filtrar por categoría"),
+    status: Optional[ProductStatus] = Query(None, description="Filtrar por estado")
+):
+    """Percentiles de precio o stock (modo columnar)"""
+    require_columnar()
+    values = columnar_index.values(field.value, category=category, status=status)
+    if not len(values):
+        return {"field": field, "count": 0, "percentiles": {}}
     
-    for product in products_db.values():
-        # Categorías
-        cat = product["category"]
-        categories[cat] = categories.get(cat, 0) + 1
-        
-        # Estados
-        status = product["status"]
-        status_counts[status] = status_counts.get(status, 0) + 1
+    points = [5, 25, 50, 75, 90, 95, 99]
+    results = np.percentile(values, points)
+    return {
+        "field": field,
+        "count": int(len(values)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": round(float(values.mean()), 2),
+        "percentiles": {f"p{point}": round(float(value), 2) for point, value in zip(points, results)}
+    }
+
+@app.get("/products/stats/histogram")
+def get_products_histogram(
+    field: StatsField = Query(StatsField.price, description="Campo a analizar"),
+    bins: int = Query(10, ge=1, le=100, description="Número de intervalos"),
+    category: Optional[ProductCategory] = Query(None, description="Filtrar por categoría"),
+    status: Optional[ProductStatus] = Query(None, description="Filtrar por estado")
+):
+    """Histograma de precio o stock (modo columnar)"""
+    require_columnar()
+    values = columnar_index.values(field.value, category=category, status=status)
+    if not len(values):
+        return {"field": field, "count": 0, "bins": []}
     
+    counts, edges = np.histogram(values, bins=bins)
     return {
-        "total_products": total_products,
-        "total_inventory_value": round(total_value, 2),
-        "average_price": round(average_price, 2),
-        "categories": categories,
-        "status_counts": status_counts
+        "field": field,
+        "count": int(len(values)),
+        "bins": [
+            {"from": round(float(edges[i]), 2), "to": round(float(edges[i + 1]), 2), "count": int(count)}
+            for i, count in enumerate(counts)
+        ]
     }
 
 @app.get("/products/category/{category}", response_model=List[ProductResponse])
 def get_products_by_category(category: ProductCategory):
     """Obtener productos por categoría específica (BONUS)"""
-    products = [p for p in products_db.values() if p["category"] == category]
-    return [ProductResponse(**product) for product in products]
+    products = products_db.get_many(list(category_index.iter_ids(category)))
+    return products_json.list_response(products)
 
 # ==================== DATOS DE EJEMPLO ====================
 
@@ -358,8 +1416,17 @@ def add_sample_data():
         product_create = ProductCreate(**product_data)
         create_product_record(product_create)
 
-# Agregar datos de ejemplo al iniciar
-add_sample_data()
+# SEED_SAMPLE_DATA=0 arranca con el catálogo vacío
+SEED_SAMPLE_DATA = os.getenv("SEED_SAMPLE_DATA", "1") == "1"
+
+# La carga se hace en el lifespan y no al importar el módulo, para que
+# importar (tests, benchmarks, cada worker) no valide ni lea del disco
+def load_products():
+    """Recuperar el catálogo del disco y sembrar ejemplos si quedó vacío"""
+    if products_journal is not None:
+        products_journal.recover(products_db)
+    if SEED_SAMPLE_DATA and not len(products_db):
+        add_sample_data()
 
 # ==================== PUNTO DE ENTRADA ====================
 
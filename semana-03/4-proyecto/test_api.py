@@ -144,7 +144,9 @@ def test_filters():
         {"filter": "max_price=500", "description": "Precio máximo"},
         {"filter": "category=electronics", "description": "Por categoría"},
         {"filter": "status=active", "description": "Por status"},
-        {"filter": "min_price=100&max_price=500", "description": "Rango de precios"}
+        {"filter": "min_price=100&max_price=500", "description": "Rango de precios"},
+        {"filter": "sort=price_asc&limit=5", "description": "Orden por precio ascendente"},
+        {"filter": "sort=price_desc&category=electronics", "description": "Orden por precio descendente"}
     ]
     
     passed = 0
@@ -196,6 +198,29 @@ def test_update_product(product_id):
         print(f"❌ Error en la prueba: {e}")
         return False
 
+def test_patch_null_rejected(product_id):
+    """Un null en un campo obligatorio da 422 y no cambia el producto"""
+    if product_id is None:
+        print("\n⚠️  Saltando prueba de PATCH con null (no hay producto)")
+        return True
+    
+    print(f"\n🚫 Probando PATCH con null en el producto {product_id}...")
+    try:
+        before = requests.get(f"{BASE_URL}/products/{product_id}").json()
+        for field in ("name", "price", "stock", "category", "status"):
+            response = requests.patch(f"{BASE_URL}/products/{product_id}", json={field: None})
+            if response.status_code != 422:
+                print(f"❌ PATCH {{\"{field}\": null}} respondió {response.status_code}, esperado 422")
+                return False
+        if requests.get(f"{BASE_URL}/products/{product_id}").json() != before:
+            print("❌ El producto cambió tras los PATCH rechazados")
+            return False
+        print("✅ Los null se rechazan con 422 sin tocar el producto")
+        return True
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
 def test_duplicate_validation():
     """Probar validación de nombres duplicados (si está implementada)"""
     print("\n🔄 Probando validación de duplicados...")
@@ -223,6 +248,82 @@ def test_duplicate_validation():
         print(f"❌ Error en la prueba: {e}")
         return False
 
+def test_summary_consistency():
+    """Probar que el resumen incremental coincide con un recálculo completo"""
+    print("\n📊 Probando consistencia del resumen...")
+    try:
+        response = requests.get(f"{BASE_URL}/products/stats/summary?verify=true")
+        if response.status_code == 200 and response.json().get("consistent"):
+            print("✅ Resumen consistente con el catálogo")
+            return True
+        else:
+            print(f"❌ Resumen inconsistente: {response.status_code} {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
+def test_import_export():
+    """Probar importación CSV en lote y exportación NDJSON"""
+    print("\n📥 Probando importación y exportación...")
+    csv_data = (
+        "name,price,stock,category\n"
+        "producto importado uno,10.5,3,home\n"
+        "producto importado dos,20,1,sports\n"
+        "X,-1,0,home\n"  # Debe fallar
+    )
+    
+    try:
+        response = requests.post(
+            f"{BASE_URL}/products/import",
+            data=csv_data.encode("utf-8"),
+            headers={"Content-Type": "text/csv"}
+        )
+        if response.status_code != 200:
+            print(f"❌ Error al importar: {response.status_code}")
+            return False
+        result = response.json()
+        print(f"✅ Importación: {result['created']} creados, {result['failed']} con error")
+        
+        response = requests.get(f"{BASE_URL}/products/export", stream=True)
+        exported = [json.loads(line) for line in response.iter_lines() if line]
+        print(f"   ✅ Exportados {len(exported)} productos")
+        return result["failed"] >= 1 and len(exported) > 0
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
+def test_conditional_requests(product_id):
+    """Probar ETags: 304 con If-None-Match y 412 con un If-Match viejo"""
+    if product_id is None:
+        print("\n⚠️  Saltando prueba de ETags (no hay producto)")
+        return True
+    
+    print(f"\n🏷️  Probando ETags del producto {product_id}...")
+    try:
+        response = requests.get(f"{BASE_URL}/products/{product_id}")
+        etag = response.headers.get("ETag")
+        if not etag:
+            print("❌ La respuesta no incluye ETag")
+            return False
+        
+        response = requests.get(f"{BASE_URL}/products/{product_id}", headers={"If-None-Match": etag})
+        if response.status_code != 304:
+            print(f"❌ Se esperaba 304, pero se obtuvo: {response.status_code}")
+            return False
+        print("   ✅ 304 Not Modified con el mismo ETag")
+        
+        requests.patch(f"{BASE_URL}/products/{product_id}", json={"stock": 7}, headers={"If-Match": etag})
+        response = requests.patch(f"{BASE_URL}/products/{product_id}", json={"stock": 8}, headers={"If-Match": etag})
+        if response.status_code == 412:
+            print("   ✅ 412 al escribir sobre una versión vieja")
+            return True
+        print(f"❌ Se esperaba 412, pero se obtuvo: {response.status_code}")
+        return False
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
 def run_all_tests():
     """Ejecutar todas las pruebas"""
     print("🧪 INICIANDO PRUEBAS DE VALIDACIONES Y ERRORES")
@@ -255,9 +356,21 @@ def run_all_tests():
     # Test 6: Actualización
     tests.append(test_update_product(product_id))
     
-    # Test 7: Duplicados (bonus)
+    # Test 7: PATCH con null en campos obligatorios
+    tests.append(test_patch_null_rejected(product_id))
+    
+    # Test 8: Duplicados (bonus)
     tests.append(test_duplicate_validation())
     
+    # Test 9: Resumen incremental
+    tests.append(test_summary_consistency())
+    
+    # Test 10: Importación y exportación en lote
+    tests.append(test_import_export())
+    
+    # Test 11: ETags y peticiones condicionales
+    tests.append(test_conditional_requests(product_id))
+    
     # Resultados
     passed = sum(tests)
     total = len(tests)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de rendimiento para la API de Biblioteca - Semana 4
+Ejecutar: python benchmark.py [nombre_benchmark]
+Sin argumentos se ejecutan todos los benchmarks.
+
+No necesita el servidor corriendo: llama a las apps ASGI en el mismo proceso
+y usa una base de datos temporal (no toca library.db).
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+# La URL se fija antes de importar las apps, que crean su engine al importarse
+DATA_DIR = tempfile.mkdtemp(prefix="biblioteca-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DATA_DIR}/benchmark.db")
+os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{DATA_DIR}/benchmark.db")
+
+import httpx
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import ejemplo_async
+import ejemplo_main
+from biblioteca_comun import (
+    Base, Book, Loan, Page, User, create_db_engine, create_search_index,
+    create_stats_counters, search_books_statement, stats_statement
+)
+from ejemplo_main import SessionLocal
+
+def ensure_library(users: int, books: int):
+    """Completar la base de datos hasta tener al menos `users` usuarios y `books` libros"""
+    with SessionLocal() as db:
+        existing_users = db.query(User).count()
+        db.add_all(
+            User(name=f"Usuario {i}", email=f"usuario{i}@ejemplo.com")
+            for i in range(existing_users, users)
+        )
+        existing_books = db.query(Book).count()
+        db.add_all(
+            Book(title=f"Libro de prueba {i}", author=f"Autor {i % 500}", publication_year=1900 + i % 120)
+            for i in range(existing_books, books)
+        )
+        db.commit()
+        if not db.query(Loan).count():
+            db.add_all(Loan(user_id=i + 1, book_id=i + 1) for i in range(min(users, books) // 10))
+            db.commit()
+
+async def run_load(app, paths: List[str], total: int, concurrency: int) -> float:
+    """Peticiones por segundo con `concurrency` clientes simultáneos.
+
+    Si alguna petición falla (p. ej. el pool de conexiones se agota) se propaga el error.
+    """
+    transport = httpx.ASGITransport(app=app)
+    requests = itertools.cycle(paths)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(count: int):
+            for _ in range(count):
+                response = await client.get(next(requests))
+                assert response.status_code == 200, response.text
+
+        await worker(1)  # Calentamiento
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(total // concurrency) for _ in range(concurrency)))
+        return (total // concurrency) * concurrency / (time.perf_counter() - start)
+
+# ==================== BENCHMARKS ====================
+
+def bench_sync_vs_async(total: int = 2_000):
+    """Mezcla de lecturas (detalle, listado, estadísticas): endpoints sync vs async"""
+    ensure_library(users=1_000, books=5_000)
+    paths = [
+        "/api/v1/books/42",
+        "/api/v1/users/7",
+        "/api/v1/books/?skip=100&limit=20",
+        "/api/v1/stats/books",
+        "/api/v1/loans/user/3",
+    ]
+
+    async def compare():
+        # Un solo event loop: el pool async queda ligado al loop donde se abrió
+        for concurrency in (1, 50, 200):
+            results = {}
+            for name, app in (("sync", ejemplo_main.app), ("async", ejemplo_async.app)):
+                try:
+                    results[name] = f"{await run_load(app, paths, total, concurrency):7.0f} req/s"
+                except Exception as error:
+                    results[name] = f"falló ({type(error).__name__})"
+            print(f"   {concurrency:>3} clientes | sync {results['sync']} | async {results['async']}")
+        await ejemplo_async.async_engine.dispose()
+
+    asyncio.run(compare())
+
+def read_write_load(engine, seconds: float, readers: int, writers: int) -> Tuple[int, int, int]:
+    """(lecturas, escrituras, errores "database is locked") en `seconds` segundos"""
+    deadline = time.perf_counter() + seconds
+    totals = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        done = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(select(Book).where(Book.id == random.randint(1, 5_000))).first()
+                    connection.scalar(select(func.count()).select_from(Book).where(Book.is_available == True))
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            totals["reads"] += done
+            totals["errors"] += errors
+
+    def writer():
+        done = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                with Session(engine) as db:
+                    book_id = random.randint(1, 5_000)
+                    db.execute(update(Book).where(Book.id == book_id).values(is_available=~Book.is_available))
+                    db.add(Loan(user_id=1, book_id=book_id, is_returned=True))
+                    db.commit()
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            totals["writes"] += done
+            totals["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return totals["reads"], totals["writes"], totals["errors"]
+
+def bench_sqlite_pragmas(seconds: float = 5.0, readers: int = 8, writers: int = 2):
+    """Lecturas y escrituras concurrentes: SQLite por defecto vs WAL + PRAGMAs"""
+    modes = (
+        # busy_timeout igual en ambos para comparar solo el modo de journal y la sincronización
+        ("por defecto (rollback journal)", {"busy_timeout": 5000}),
+        ("WAL + PRAGMAs", None),
+    )
+    for number, (label, pragmas) in enumerate(modes):
+        url = f"sqlite:///{DATA_DIR}/pragmas-{number}.db"
+        engine = create_db_engine(url, pragmas=pragmas)
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            db.add(User(name="Usuario", email="usuario@ejemplo.com"))
+            db.add_all(Book(title=f"Libro {i}", author=f"Autor {i % 500}") for i in range(5_000))
+            db.commit()
+        reads, writes, errors = read_write_load(engine, seconds, readers, writers)
+        engine.dispose()
+        print(f"   {label:<30} lecturas {reads / seconds:7.0f}/s | "
+              f"escrituras {writes / seconds:6.0f}/s | bloqueos {errors}")
+
+WORDS = ["historia", "ciudad", "noche", "jardín", "viaje", "memoria", "río", "sombra",
+         "invierno", "mar", "palabra", "tiempo", "guerra", "casa", "silencio", "fuego"]
+
+_large_engines: Dict[int, object] = {}
+
+def large_library(total: int):
+    """Engine sobre una base de datos aparte con `total` libros (más usuarios y préstamos) e índice de búsqueda"""
+    if total not in _large_engines:
+        engine = create_db_engine(f"sqlite:///{DATA_DIR}/books-{total}.db")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            for start in range(0, total, 50_000):
+                connection.execute(insert(Book), [
+                    {
+                        "title": f"{WORDS[i % 16].title()} de la {WORDS[i // 16 % 16]} {i}",
+                        "author": f"Autor {WORDS[i // 256 % 16]} {i % 500}",
+                        "is_available": True,
+                    }
+                    for i in range(start, min(start + 50_000, total))
+                ])
+            connection.execute(insert(User), [
+                {"name": f"Usuario {i}", "email": f"usuario{i}@ejemplo.com", "is_active": i % 10 != 0}
+                for i in range(total // 10)
+            ])
+            connection.execute(insert(Loan), [
+                {"user_id": i % (total // 10) + 1, "book_id": i + 1, "is_returned": i % 3 != 0}
+                for i in range(total // 4)
+            ])
+            # Índice creado después de la carga: un 'rebuild' es más rápido que los triggers fila a fila
+            create_search_index(connection)
+        _large_engines[total] = engine
+    return _large_engines[total]
+
+def timed(func: Callable[[], object], repetitions: int) -> float:
+    """Segundos promedio por ejecución"""
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        func()
+    return (time.perf_counter() - start) / repetitions
+
+def bench_deep_pages(total: int = 1_000_000, repetitions: int = 20):
+    """Páginas profundas de /books sobre 1M filas: OFFSET vs keyset (after_id)"""
+    engine = large_library(total)
+
+    def fetch(page: Page) -> List[int]:
+        with Session(engine) as db:
+            return [book.id for book in page.apply(db.query(Book), Book).all()]
+
+    limit = 100
+    for depth in (0, 10_000, 100_000, 500_000, total - limit):
+        offset_page = Page(skip=depth, limit=limit)
+        keyset_page = Page(after_id=depth, limit=limit)  # ids consecutivos desde 1
+        assert fetch(offset_page) == fetch(keyset_page)
+        times = [timed(lambda: fetch(page), repetitions) for page in (offset_page, keyset_page)]
+        print(f"   fila {depth:>9,} | OFFSET {times[0] * 1000:8.2f} ms | keyset {times[1] * 1000:6.2f} ms")
+
+def bench_search(total: int = 1_000_000, repetitions: int = 10):
+    """Búsqueda de libros sobre 1M filas: LIKE '%x%' vs FTS5 ordenado por bm25"""
+    engine = large_library(total)
+    for q in ("de", "sombra", "viaje memoria", "invierno 4242", "zzz"):
+        with Session(engine) as db:
+            def like():
+                query = db.query(Book)
+                for word in q.split():
+                    query = query.filter(Book.title.contains(word))
+                return query.limit(20).all()
+
+            def fulltext():
+                return db.scalars(search_books_statement(q, skip=0, limit=20)).all()
+
+            found = len(fulltext())
+            times = [timed(search, repetitions) for search in (like, fulltext)]
+        print(f"   {q!r:<17} ({found:>2} resultados) | LIKE {times[0] * 1000:8.2f} ms | "
+              f"FTS5 {times[1] * 1000:7.2f} ms")
+
+def bench_stats(total: int = 1_000_000, repetitions: int = 10):
+    """Dashboard de estadísticas (1M libros, 100k usuarios, 250k préstamos): COUNT por cifra vs una agregación vs contadores"""
+    engine = large_library(total)
+    with engine.begin() as connection:
+        create_stats_counters(connection)
+
+    with Session(engine) as db:
+        def separate_counts():
+            # Camino anterior: 2 + 2 + 3 consultas COUNT(*)
+            return [
+                db.query(Book).count(), db.query(Book).filter(Book.is_available == True).count(),
+                db.query(User).count(), db.query(User).filter(User.is_active == True).count(),
+                db.query(Loan).count(), db.query(Loan).filter(Loan.is_returned == False).count(),
+                db.query(Loan).filter(Loan.is_returned == True).count(),
+            ]
+
+        def sum_case():
+            # Una pasada por tabla evaluando cada fila
+            return db.execute(select(*(
+                select(func.count(), func.sum(case((condition, 1), else_=0))).select_from(model).subquery()
+                for model, condition in ((Book, Book.is_available == True), (User, User.is_active == True),
+                                         (Loan, Loan.is_returned == False))
+            ))).one()
+
+        def aggregate():
+            return db.execute(stats_statement("books", "users", "loans", counters=False)).mappings().one()
+
+        def counters():
+            return db.execute(stats_statement(counters=True)).mappings().one()
+
+        assert dict(aggregate()) == dict(counters())
+        assert tuple(sum_case()) == tuple(aggregate().values())
+        for label, stats in (("7 consultas COUNT(*)", separate_counts),
+                             ("1 consulta SUM(CASE ...)", sum_case),
+                             ("1 consulta de COUNT(*)", aggregate),
+                             ("tabla de contadores", counters)):
+            print(f"   {label:<26} {timed(stats, repetitions) * 1000:8.2f} ms")
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "sync_vs_async": bench_sync_vs_async,
+    "sqlite_pragmas": bench_sqlite_pragmas,
+    "deep_pages": bench_deep_pages,
+    "search": bench_search,
+    "stats": bench_stats,
+}
+
+def main():
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"❌ Benchmark desconocido: {name}. Disponibles: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"\n⏱️  {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
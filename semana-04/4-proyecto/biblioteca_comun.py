@@ -0,0 +1,475 @@
+# Biblioteca - Código común de las apps sync y async
+# Semana 4: modelos SQLAlchemy, schemas Pydantic y consultas compartidas
+# por ejemplo_main.py y ejemplo_async.py
+# Importarlo no crea engines ni toca la base de datos: cada app crea el suyo
+# y llama a init_db al arrancar
+
+from fastapi import HTTPException, Query, Request, Response
+from sqlalchemy import create_engine, event, func, select, text, Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declarative_base, relationship
+from pydantic import BaseModel, field_validator
+from typing import Annotated, List, Optional
+from datetime import datetime
+import base64
+import binascii
+import os
+import re
+
+# ============================
+# CONFIGURACIÓN DE BASE DE DATOS
+# ============================
+
+# PRAGMAs aplicados a cada conexión SQLite nueva.
+# WAL: los lectores no se bloquean mientras alguien escribe (y viceversa);
+# con WAL, synchronous=NORMAL sigue siendo seguro ante caídas de la aplicación.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000")),  # Negativo = KiB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 2**20))),
+    "temp_store": "MEMORY",
+}
+
+# Pool de conexiones. Una petición sync conserva su conexión hasta que get_db
+# la cierra y, entre el endpoint y ese cierre, vuelve a necesitar un hilo del
+# threadpool (40 hilos) para validar la respuesta. Si todos los hilos esperaran
+# conexiones retenidas por peticiones sin hilo, ninguna avanzaría: por eso
+# ejemplo_main.py deja pasar como mucho DB_MAX_CONNECTIONS peticiones a la vez
+# (el resto espera en el event loop) y el pool por defecto cubre los 40 hilos.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# None = sin límite (DB_MAX_OVERFLOW=-1 en SQLAlchemy)
+DB_MAX_CONNECTIONS = DB_POOL_SIZE + DB_MAX_OVERFLOW if DB_MAX_OVERFLOW >= 0 else None
+
+def engine_options(url: str) -> dict:
+    """Argumentos para create_engine / create_async_engine según la URL"""
+    options = {}
+    if url.startswith("sqlite") and "aiosqlite" not in url:
+        options["connect_args"] = {"check_same_thread": False}
+    # SQLite en memoria usa un pool de una sola conexión, sin tamaño configurable
+    if ":memory:" not in url and url.rstrip("/") not in ("sqlite:", "sqlite+aiosqlite:"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return options
+
+def configure_sqlite(engine: Engine, pragmas: Optional[dict] = None) -> Engine:
+    """Registrar los PRAGMAs en el evento connect del engine (sync o async.sync_engine)"""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+def create_db_engine(url: str, pragmas: Optional[dict] = None) -> Engine:
+    """Engine sync con pool dimensionado y, en SQLite, los PRAGMAs de SQLITE_PRAGMAS"""
+    engine = create_engine(url, **engine_options(url))
+    if url.startswith("sqlite"):
+        configure_sqlite(engine, pragmas)
+    return engine
+
+Base = declarative_base()
+
+# ============================
+# MODELOS SQLAlchemy (Moderno)
+# ============================
+
+class User(Base):
+    __tablename__ = "users"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    email = Column(String(255), unique=True, nullable=False, index=True)
+    phone = Column(String(20), nullable=True)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relación con préstamos
+    loans = relationship("Loan", back_populates="user")
+
+class Book(Base):
+    __tablename__ = "books"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(200), nullable=False, index=True)
+    author = Column(String(100), nullable=False)
+    isbn = Column(String(20), unique=True, nullable=True)
+    publication_year = Column(Integer, nullable=True)
+    is_available = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relación con préstamos
+    loans = relationship("Loan", back_populates="book")
+
+class Loan(Base):
+    __tablename__ = "loans"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    loan_date = Column(DateTime, default=datetime.utcnow)
+    return_date = Column(DateTime, nullable=True)
+    is_returned = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relaciones
+    user = relationship("User", back_populates="loans")
+    book = relationship("Book", back_populates="loans")
+
+# ============================
+# BÚSQUEDA DE TEXTO COMPLETO (SQLite FTS5)
+# ============================
+
+# Índice FTS5 de contenido externo: guarda solo el índice invertido y lee
+# las columnas de `books`; los triggers lo mantienen al día en cada escritura
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE books_fts USING fts5(
+        title, author, isbn,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, isbn)
+        VALUES (new.id, new.title, new.author, new.isbn);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, isbn)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author, isbn ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, isbn)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn);
+        INSERT INTO books_fts(rowid, title, author, isbn)
+        VALUES (new.id, new.title, new.author, new.isbn);
+    END""",
+]
+
+# Búsqueda ordenada por relevancia entre todas las coincidencias. `rank` usa
+# bm25 con pesos por columna (una coincidencia en el título cuenta más que en
+# el autor) y el id desempata, para que las páginas de `skip` no se solapen.
+# FTS5 ordena solo rowid y rank; las filas de books se leen para la página pedida.
+# Puntuar todas las coincidencias tiene su costo: una palabra que aparece en casi
+# todos los libros ("de") tarda del orden de un segundo sobre 1M filas
+SEARCH_BOOKS_SQL = text("""
+    WITH page AS (
+        SELECT rowid, rank FROM books_fts
+        WHERE books_fts MATCH :query AND rank MATCH 'bm25(10.0, 5.0, 1.0)'
+        ORDER BY rank, rowid
+        LIMIT :limit OFFSET :skip
+    )
+    SELECT books.* FROM page JOIN books ON books.id = page.rowid
+    ORDER BY page.rank, page.rowid
+""")
+
+def create_search_index(connection):
+    """Crear books_fts y sus triggers si faltan, indexando los libros existentes"""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).first()
+    for statement in SEARCH_INDEX_DDL[bool(exists):]:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        connection.exec_driver_sql("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+def fts_query(q: str) -> str:
+    """Convertir texto libre en una consulta FTS5 segura: todas las palabras, como prefijo"""
+    words = re.findall(r"\w+", q)
+    if not words:
+        raise HTTPException(status_code=400, detail="La búsqueda no contiene palabras")
+    return " ".join(f'"{word}"*' for word in words)
+
+def search_books_statement(q: str, skip: int, limit: int):
+    """SELECT de libros ordenados por relevancia (sirve para Session y AsyncSession)"""
+    return select(Book).from_statement(
+        SEARCH_BOOKS_SQL.bindparams(query=fts_query(q), skip=skip, limit=limit)
+    )
+
+# ============================
+# ESTADÍSTICAS AGREGADAS
+# ============================
+
+# Con STATS_COUNTERS=1 las estadísticas se leen de library_counters, una
+# tabla de contadores que mantienen triggers; sin él se agregan las tablas
+STATS_COUNTERS = os.getenv("STATS_COUNTERS", "0") == "1"
+
+def count_rows(model, *conditions):
+    """(SELECT COUNT(*) FROM tabla WHERE ...) como subconsulta escalar"""
+    return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+# Cifras base de cada sección. Se piden todas en un solo SELECT de subconsultas
+# COUNT(*): un viaje a la base de datos, y SQLite conserva su atajo para COUNT(*)
+# (recorre el índice más pequeño), que un SUM(CASE ...) sobre la tabla pierde
+STATS_FIGURES = {
+    "books": {
+        "total_books": count_rows(Book),
+        "available_books": count_rows(Book, Book.is_available == True),
+    },
+    "users": {
+        "total_users": count_rows(User),
+        "active_users": count_rows(User, User.is_active == True),
+    },
+    "loans": {
+        "total_loans": count_rows(Loan),
+        "active_loans": count_rows(Loan, Loan.is_returned == False),
+    },
+}
+
+# tabla: (contador total, contador parcial, columna, condición del parcial sobre {row})
+COUNTED_TABLES = {
+    "books": ("total_books", "available_books", "is_available", "{row}.is_available = 1"),
+    "users": ("total_users", "active_users", "is_active", "{row}.is_active = 1"),
+    "loans": ("total_loans", "active_loans", "is_returned", "{row}.is_returned = 0"),
+}
+
+COUNTERS_QUERY = text("SELECT " + ", ".join(
+    f"SUM(CASE WHEN name = '{name}' THEN value ELSE 0 END) AS {name}"
+    for total, partial, _, _ in COUNTED_TABLES.values() for name in (total, partial)
+) + " FROM library_counters")
+
+def counter_triggers(table: str) -> List[str]:
+    total, partial, column, condition = COUNTED_TABLES[table]
+    new = f"COALESCE({condition.format(row='new')}, 0)"
+    old = f"COALESCE({condition.format(row='old')}, 0)"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_counters_insert AFTER INSERT ON {table} BEGIN
+            UPDATE library_counters SET value = value + 1 WHERE name = '{total}';
+            UPDATE library_counters SET value = value + {new} WHERE name = '{partial}';
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_counters_delete AFTER DELETE ON {table} BEGIN
+            UPDATE library_counters SET value = value - 1 WHERE name = '{total}';
+            UPDATE library_counters SET value = value - {old} WHERE name = '{partial}';
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_counters_update AFTER UPDATE OF {column} ON {table} BEGIN
+            UPDATE library_counters SET value = value + {new} - {old} WHERE name = '{partial}';
+        END""",
+    ]
+
+def create_stats_counters(connection):
+    """Crear library_counters y sus triggers, y recalcular los contadores desde las tablas"""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS library_counters (name VARCHAR(50) PRIMARY KEY, value INTEGER NOT NULL)"
+    )
+    for table in COUNTED_TABLES:
+        for statement in counter_triggers(table):
+            connection.exec_driver_sql(statement)
+    # Recalcular dentro de la misma transacción que los triggers: no se pierde ninguna escritura
+    connection.exec_driver_sql("DELETE FROM library_counters")
+    figures = connection.execute(stats_statement(*STATS_FIGURES, counters=False)).mappings().one()
+    connection.execute(
+        text("INSERT INTO library_counters (name, value) VALUES (:name, :value)"),
+        [{"name": name, "value": value} for name, value in figures.items()]
+    )
+
+def stats_statement(*sections: str, counters: bool = STATS_COUNTERS):
+    """Una consulta con las cifras de `sections` (books, users, loans) en una sola fila"""
+    if counters:
+        return COUNTERS_QUERY
+    return select(*(
+        figure.label(name) for section in sections for name, figure in STATS_FIGURES[section].items()
+    ))
+
+def books_stats(figures) -> dict:
+    return {
+        "total_books": figures["total_books"],
+        "available_books": figures["available_books"],
+        "borrowed_books": figures["total_books"] - figures["available_books"]
+    }
+
+def users_stats(figures) -> dict:
+    return {
+        "total_users": figures["total_users"],
+        "active_users": figures["active_users"]
+    }
+
+def loans_stats(figures) -> dict:
+    return {
+        "total_loans": figures["total_loans"],
+        "active_loans": figures["active_loans"],
+        "returned_loans": figures["total_loans"] - figures["active_loans"]
+    }
+
+def dashboard_stats(figures) -> dict:
+    return {
+        "books": books_stats(figures),
+        "users": users_stats(figures),
+        "loans": loans_stats(figures),
+        "source": "counters" if STATS_COUNTERS else "aggregate"
+    }
+
+def init_db(connection):
+    """Crear las tablas, el índice de búsqueda y (con STATS_COUNTERS) los contadores"""
+    Base.metadata.create_all(bind=connection)
+    create_search_index(connection)
+    if STATS_COUNTERS:
+        create_stats_counters(connection)
+
+# ============================
+# SCHEMAS PYDANTIC (v2.x Compatible)
+# ============================
+
+class UserBase(BaseModel):
+    name: str
+    email: str
+    phone: Optional[str] = None
+    
+    @field_validator('email')
+    @classmethod
+    def validate_email(cls, v: str) -> str:
+        # Validación básica de email compatible con Pydantic 2.x
+        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        if not re.match(pattern, v):
+            raise ValueError('Formato de email inválido')
+        return v
+    
+    @field_validator('name')
+    @classmethod
+    def validate_name(cls, v: str) -> str:
+        if len(v.strip()) < 2:
+            raise ValueError('El nombre debe tener al menos 2 caracteres')
+        return v.strip()
+
+class UserCreate(UserBase):
+    pass
+
+class UserResponse(UserBase):
+    id: int
+    is_active: bool
+    created_at: datetime
+    
+    model_config = {"from_attributes": True}  # Pydantic 2.x
+
+class BookBase(BaseModel):
+    title: str
+    author: str
+    isbn: Optional[str] = None
+    publication_year: Optional[int] = None
+    
+    @field_validator('title')
+    @classmethod
+    def validate_title(cls, v: str) -> str:
+        if len(v.strip()) < 1:
+            raise ValueError('El título es requerido')
+        return v.strip()
+    
+    @field_validator('author')
+    @classmethod
+    def validate_author(cls, v: str) -> str:
+        if len(v.strip()) < 1:
+            raise ValueError('El autor es requerido')
+        return v.strip()
+    
+    @field_validator('publication_year')
+    @classmethod
+    def validate_year(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and (v < 1000 or v > datetime.now().year + 1):
+            raise ValueError(f'Año debe estar entre 1000 y {datetime.now().year + 1}')
+        return v
+
+class BookCreate(BookBase):
+    pass
+
+class BookResponse(BookBase):
+    id: int
+    is_available: bool
+    created_at: datetime
+    
+    model_config = {"from_attributes": True}
+
+class LoanBase(BaseModel):
+    user_id: int
+    book_id: int
+
+class LoanCreate(LoanBase):
+    pass
+
+class LoanResponse(LoanBase):
+    id: int
+    loan_date: datetime
+    return_date: Optional[datetime] = None
+    is_returned: bool
+    created_at: datetime
+    
+    model_config = {"from_attributes": True}
+
+# ============================
+# PAGINACIÓN
+# ============================
+
+def encode_cursor(last_id: int) -> str:
+    """Cursor opaco para pedir la página siguiente a `last_id`"""
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        prefix, last_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        if prefix != "id":
+            raise ValueError(prefix)
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+# Tope de `limit` en los listados: sin él, una sola petición puede leer y
+# serializar la tabla entera
+MAX_PAGE_SIZE = 1000
+
+class Page:
+    """Parámetros de paginación de los listados.
+
+    Con `cursor` (o `after_id`) se usa keyset: WHERE id > after_id, que salta
+    directamente por el índice de la clave primaria. `skip` (OFFSET) se mantiene
+    por compatibilidad, pero SQLite recorre y descarta las `skip` filas previas.
+    """
+
+    def __init__(self, skip: Annotated[Optional[int], Query(ge=0)] = None,
+                 limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = 100,
+                 cursor: Optional[str] = None, after_id: Optional[int] = None):
+        if cursor is not None and after_id is not None:
+            raise HTTPException(status_code=400, detail="Usa cursor o after_id, no ambos")
+        # Keyset no usa OFFSET: ignorar skip en silencio devolvería otra página
+        if skip is not None and (cursor is not None or after_id is not None):
+            raise HTTPException(status_code=400, detail="skip no se puede combinar con cursor ni after_id")
+        self.skip = skip or 0
+        self.limit = limit
+        self.after_id = decode_cursor(cursor) if cursor is not None else after_id
+
+    def apply(self, query, model):
+        """Ordenar por id y recortar la página (sirve para Query y para select())"""
+        query = query.order_by(model.id)
+        if self.after_id is not None:
+            return query.where(model.id > self.after_id).limit(self.limit)
+        return query.offset(self.skip).limit(self.limit)
+
+    def add_next_link(self, request: Request, response: Response, items: list):
+        """Cabeceras X-Next-Cursor y Link rel="next" si la página vino completa"""
+        if not items or len(items) < self.limit:
+            return
+        cursor = encode_cursor(items[-1].id)
+        next_url = request.url.remove_query_params(["skip", "after_id"]).include_query_params(cursor=cursor)
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+def deprecate_title_search(request: Request, response: Response, title: str):
+    """Cabeceras de /books/search/{title}: obsoleto, con enlace a la búsqueda FTS5"""
+    successor = request.url_for("search_books_fulltext").include_query_params(q=title)
+    response.headers["Deprecation"] = "true"
+    response.headers["Link"] = f'<{successor}>; rel="successor-version"'
+
+def add_offset_next_link(request: Request, response: Response, skip: int, limit: int, items: list):
+    """Link rel="next" con skip para resultados sin orden por id (p. ej. por relevancia)"""
+    if items and len(items) >= limit:
+        next_url = request.url.include_query_params(skip=skip + limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
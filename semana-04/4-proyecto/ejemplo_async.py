@@ -0,0 +1,372 @@
+# API de Biblioteca - Modo Async
+# Semana 4: los mismos modelos (biblioteca_comun.py) y endpoints de ejemplo_main.py con SQLAlchemy async
+# Cada petición espera la base de datos sin ocupar un hilo del threadpool
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, List
+import os
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from biblioteca_comun import (
+    Page, add_offset_next_link, configure_sqlite, deprecate_title_search, engine_options, init_db,
+    search_books_statement, stats_statement,
+    books_stats, users_stats, loans_stats, dashboard_stats, User, Book, Loan,
+    UserCreate, UserResponse, BookCreate, BookResponse, LoanCreate, LoanResponse
+)
+
+# ============================
+# CONFIGURACIÓN DE BASE DE DATOS
+# ============================
+
+# aiosqlite en local; cualquier URL async de SQLAlchemy sirve (p. ej. postgresql+asyncpg://...)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "sqlite+aiosqlite:///./library.db")
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    # Los eventos de conexión se registran en el engine sync que envuelve al async
+    configure_sqlite(async_engine.sync_engine)
+# expire_on_commit=False: los objetos siguen legibles después del commit sin
+# otra consulta (en async no hay carga perezosa implícita)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# ============================
+# DEPENDENCIAS
+# ============================
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def count(db: AsyncSession, model, *conditions) -> int:
+    """SELECT COUNT(*) con filtros opcionales"""
+    return await db.scalar(select(func.count()).select_from(model).where(*conditions))
+
+# ============================
+# APLICACIÓN FASTAPI
+# ============================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Crear las tablas (y el índice de búsqueda) al arrancar y cerrar el pool de conexiones al apagar"""
+    async with async_engine.begin() as connection:
+        await connection.run_sync(init_db)
+    yield
+    await async_engine.dispose()
+
+app = FastAPI(
+    title="API de Biblioteca (async)",
+    description="Sistema de gestión de biblioteca con FastAPI y SQLAlchemy async",
+    version="2.0.0",
+    lifespan=lifespan
+)
+
+# ============================
+# ENDPOINTS DE USUARIOS
+# ============================
+
+@app.post("/api/v1/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    """Crear un nuevo usuario"""
+    # Verificar email único
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if db_user:
+        raise HTTPException(
+            status_code=400,
+            detail="El email ya está registrado"
+        )
+    
+    db_user = User(**user.model_dump())
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@app.get("/api/v1/users/", response_model=List[UserResponse])
+async def list_users(request: Request, response: Response, page: Page = Depends(),
+                     db: AsyncSession = Depends(get_db)):
+    """Listar usuarios con paginación (cursor/after_id o skip)"""
+    users = (await db.scalars(page.apply(select(User), User))).all()
+    page.add_next_link(request, response, users)
+    return users
+
+@app.get("/api/v1/users/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    """Obtener usuario por ID"""
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return user
+
+@app.put("/api/v1/users/{user_id}", response_model=UserResponse)
+async def update_user(user_id: int, user_update: UserCreate, db: AsyncSession = Depends(get_db)):
+    """Actualizar usuario existente"""
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    
+    # Verificar email único si ha cambiado
+    if user_update.email != user.email:
+        existing_user = await db.scalar(select(User).where(User.email == user_update.email))
+        if existing_user:
+            raise HTTPException(status_code=400, detail="El email ya está registrado")
+    
+    for key, value in user_update.model_dump().items():
+        setattr(user, key, value)
+    
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+@app.delete("/api/v1/users/{user_id}")
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    """Eliminar usuario (solo si no tiene préstamos activos)"""
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    
+    # Verificar que no tenga préstamos activos
+    active_loans = await count(db, Loan, Loan.user_id == user_id, Loan.is_returned == False)
+    if active_loans > 0:
+        raise HTTPException(
+            status_code=400,
+            detail="No se puede eliminar usuario con préstamos activos"
+        )
+    
+    await db.delete(user)
+    await db.commit()
+    return {"message": "Usuario eliminado correctamente"}
+
+# ============================
+# ENDPOINTS DE LIBROS
+# ============================
+
+@app.post("/api/v1/books/", response_model=BookResponse, status_code=status.HTTP_201_CREATED)
+async def create_book(book: BookCreate, db: AsyncSession = Depends(get_db)):
+    """Crear un nuevo libro"""
+    # Verificar ISBN único si se proporciona
+    if book.isbn:
+        db_book = await db.scalar(select(Book).where(Book.isbn == book.isbn))
+        if db_book:
+            raise HTTPException(
+                status_code=400,
+                detail="ISBN ya registrado"
+            )
+    
+    db_book = Book(**book.model_dump())
+    db.add(db_book)
+    await db.commit()
+    await db.refresh(db_book)
+    return db_book
+
+@app.get("/api/v1/books/", response_model=List[BookResponse])
+async def list_books(request: Request, response: Response, page: Page = Depends(),
+                     db: AsyncSession = Depends(get_db)):
+    """Listar libros con paginación (cursor/after_id o skip)"""
+    books = (await db.scalars(page.apply(select(Book), Book))).all()
+    page.add_next_link(request, response, books)
+    return books
+
+@app.get("/api/v1/books/{book_id}", response_model=BookResponse)
+async def get_book(book_id: int, db: AsyncSession = Depends(get_db)):
+    """Obtener libro por ID"""
+    book = await db.get(Book, book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    return book
+
+@app.get("/api/v1/books/search/{title}", response_model=List[BookResponse], deprecated=True)
+async def search_books(request: Request, response: Response, title: str, db: AsyncSession = Depends(get_db)):
+    """Buscar libros por título (obsoleto: recorre toda la tabla; usar /api/v1/search/books)"""
+    deprecate_title_search(request, response, title)
+    books = await db.scalars(select(Book).where(Book.title.contains(title)))
+    return books.all()
+
+@app.put("/api/v1/books/{book_id}", response_model=BookResponse)
+async def update_book(book_id: int, book_update: BookCreate, db: AsyncSession = Depends(get_db)):
+    """Actualizar libro existente"""
+    book = await db.get(Book, book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    
+    # Verificar ISBN único si ha cambiado
+    if book_update.isbn and book_update.isbn != book.isbn:
+        existing_book = await db.scalar(select(Book).where(Book.isbn == book_update.isbn))
+        if existing_book:
+            raise HTTPException(status_code=400, detail="ISBN ya registrado")
+    
+    for key, value in book_update.model_dump().items():
+        setattr(book, key, value)
+    
+    await db.commit()
+    await db.refresh(book)
+    return book
+
+@app.delete("/api/v1/books/{book_id}")
+async def delete_book(book_id: int, db: AsyncSession = Depends(get_db)):
+    """Eliminar libro"""
+    book = await db.get(Book, book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    
+    await db.delete(book)
+    await db.commit()
+    return {"message": "Libro eliminado correctamente"}
+
+@app.get("/api/v1/search/books", response_model=List[BookResponse])
+async def search_books_fulltext(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, description="Palabras a buscar en título, autor e ISBN"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Búsqueda de texto completo ordenada por relevancia (FTS5 + bm25)"""
+    books = (await db.scalars(search_books_statement(q, skip, limit))).all()
+    add_offset_next_link(request, response, skip, limit, books)
+    return books
+
+# ============================
+# ENDPOINTS DE PRÉSTAMOS
+# ============================
+
+@app.post("/api/v1/loans/", response_model=LoanResponse, status_code=status.HTTP_201_CREATED)
+async def create_loan(loan: LoanCreate, db: AsyncSession = Depends(get_db)):
+    """Crear un nuevo préstamo"""
+    # Verificar que el libro existe y está disponible
+    book = await db.get(Book, loan.book_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    if not book.is_available:
+        raise HTTPException(status_code=400, detail="Libro no disponible")
+    
+    # Verificar que el usuario existe
+    user = await db.get(User, loan.user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    
+    # Verificar límite de préstamos por usuario (máximo 3)
+    active_loans = await count(db, Loan, Loan.user_id == loan.user_id, Loan.is_returned == False)
+    if active_loans >= 3:
+        raise HTTPException(
+            status_code=400,
+            detail="Usuario ya tiene el máximo de préstamos permitidos (3)"
+        )
+    
+    # Crear préstamo
+    db_loan = Loan(**loan.model_dump())
+    db.add(db_loan)
+    
+    # Marcar libro como no disponible
+    book.is_available = False
+    
+    await db.commit()
+    await db.refresh(db_loan)
+    return db_loan
+
+@app.get("/api/v1/loans/", response_model=List[LoanResponse])
+async def list_loans(request: Request, response: Response, page: Page = Depends(),
+                     db: AsyncSession = Depends(get_db)):
+    """Listar préstamos con paginación (cursor/after_id o skip)"""
+    loans = (await db.scalars(page.apply(select(Loan), Loan))).all()
+    page.add_next_link(request, response, loans)
+    return loans
+
+# Antes de /loans/{loan_id}: si no, "active" se toma como un ID y responde 422
+@app.get("/api/v1/loans/active", response_model=List[LoanResponse])
+async def get_active_loans(db: AsyncSession = Depends(get_db)):
+    """Obtener todos los préstamos activos"""
+    loans = await db.scalars(select(Loan).where(Loan.is_returned == False))
+    return loans.all()
+
+@app.get("/api/v1/loans/{loan_id}", response_model=LoanResponse)
+async def get_loan(loan_id: int, db: AsyncSession = Depends(get_db)):
+    """Obtener préstamo por ID"""
+    loan = await db.get(Loan, loan_id)
+    if loan is None:
+        raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+    return loan
+
+@app.put("/api/v1/loans/{loan_id}/return", response_model=LoanResponse)
+async def return_book(loan_id: int, db: AsyncSession = Depends(get_db)):
+    """Devolver un libro prestado"""
+    loan = await db.get(Loan, loan_id)
+    if loan is None:
+        raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+    
+    if loan.is_returned:
+        raise HTTPException(status_code=400, detail="Libro ya fue devuelto")
+    
+    # Marcar préstamo como devuelto
+    loan.is_returned = True
+    loan.return_date = datetime.utcnow()
+    
+    # Marcar libro como disponible
+    book = await db.get(Book, loan.book_id)
+    if book:
+        book.is_available = True
+    
+    await db.commit()
+    await db.refresh(loan)
+    return loan
+
+@app.get("/api/v1/loans/user/{user_id}", response_model=List[LoanResponse])
+async def get_user_loans(user_id: int, db: AsyncSession = Depends(get_db)):
+    """Obtener préstamos de un usuario específico"""
+    loans = await db.scalars(select(Loan).where(Loan.user_id == user_id))
+    return loans.all()
+
+# ============================
+# ENDPOINTS DE ESTADÍSTICAS
+# ============================
+
+@app.get("/api/v1/stats")
+async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
+    """Estadísticas de libros, usuarios y préstamos en una sola consulta"""
+    result = await db.execute(stats_statement("books", "users", "loans"))
+    return dashboard_stats(result.mappings().one())
+
+@app.get("/api/v1/stats/books")
+async def get_books_stats(db: AsyncSession = Depends(get_db)):
+    """Obtener estadísticas de libros"""
+    return books_stats((await db.execute(stats_statement("books"))).mappings().one())
+
+@app.get("/api/v1/stats/users")
+async def get_users_stats(db: AsyncSession = Depends(get_db)):
+    """Obtener estadísticas de usuarios"""
+    return users_stats((await db.execute(stats_statement("users"))).mappings().one())
+
+@app.get("/api/v1/stats/loans")
+async def get_loans_stats(db: AsyncSession = Depends(get_db)):
+    """Obtener estadísticas de préstamos"""
+    return loans_stats((await db.execute(stats_statement("loans"))).mappings().one())
+
+# ============================
+# ENDPOINT RAÍZ
+# ============================
+
+@app.get("/")
+async def read_root():
+    """Endpoint raíz con información de la API"""
+    return {
+        "message": "API de Biblioteca - Semana 4 (async)",
+        "documentation": "/docs",
+        "status": "running",
+        "version": "2.0.0 - SQLAlchemy async"
+    }
+
+# ============================
+# CONFIGURACIÓN DE SERVIDOR
+# ============================
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "ejemplo_async:app",
+        host="0.0.0.0",
+        port=8002,
+        reload=True
+    )
@@ -2,168 +2,55 @@
 # Semana 4: Bases de Datos con FastAPI
 # Compatible con Python 3.9+ y versiones actuales
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, Session, relationship
-from pydantic import BaseModel, field_validator
-from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.orm import sessionmaker, Session
+from typing import List, Optional, Tuple
 from datetime import datetime
-import re
-
-# ============================
-# CONFIGURACIÓN DE BASE DE DATOS
-# ============================
-
-SQLALCHEMY_DATABASE_URL = "sqlite:///./library.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+import asyncio
+import os
+
+from biblioteca_comun import (
+    DB_MAX_CONNECTIONS, Page, add_offset_next_link, create_db_engine, deprecate_title_search, init_db,
+    search_books_statement, stats_statement,
+    books_stats, users_stats, loans_stats, dashboard_stats, User, Book, Loan,
+    UserCreate, UserResponse, BookCreate, BookResponse, LoanCreate, LoanResponse
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
 
 # ============================
-# MODELOS SQLAlchemy (Moderno)
+# CONFIGURACIÓN DE BASE DE DATOS
 # ============================
 
-class User(Base):
-    __tablename__ = "users"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False)
-    email = Column(String(255), unique=True, nullable=False, index=True)
-    phone = Column(String(20), nullable=True)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    
-    # Relación con préstamos
-    loans = relationship("Loan", back_populates="user")
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./library.db")
 
-class Book(Base):
-    __tablename__ = "books"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(200), nullable=False, index=True)
-    author = Column(String(100), nullable=False)
-    isbn = Column(String(20), unique=True, nullable=True)
-    publication_year = Column(Integer, nullable=True)
-    is_available = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    
-    # Relación con préstamos
-    loans = relationship("Loan", back_populates="book")
-
-class Loan(Base):
-    __tablename__ = "loans"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
-    loan_date = Column(DateTime, default=datetime.utcnow)
-    return_date = Column(DateTime, nullable=True)
-    is_returned = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    
-    # Relaciones
-    user = relationship("User", back_populates="loans")
-    book = relationship("Book", back_populates="loans")
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Crear tablas
-Base.metadata.create_all(bind=engine)
-
-# ============================
-# SCHEMAS PYDANTIC (v2.x Compatible)
-# ============================
-
-class UserBase(BaseModel):
-    name: str
-    email: str
-    phone: Optional[str] = None
-    
-    @field_validator('email')
-    @classmethod
-    def validate_email(cls, v: str) -> str:
-        # Validación básica de email compatible con Pydantic 2.x
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(pattern, v):
-            raise ValueError('Formato de email inválido')
-        return v
-    
-    @field_validator('name')
-    @classmethod
-    def validate_name(cls, v: str) -> str:
-        if len(v.strip()) < 2:
-            raise ValueError('El nombre debe tener al menos 2 caracteres')
-        return v.strip()
-
-class UserCreate(UserBase):
-    pass
-
-class UserResponse(UserBase):
-    id: int
-    is_active: bool
-    created_at: datetime
-    
-    model_config = {"from_attributes": True}  # Pydantic 2.x
-
-class BookBase(BaseModel):
-    title: str
-    author: str
-    isbn: Optional[str] = None
-    publication_year: Optional[int] = None
-    
-    @field_validator('title')
-    @classmethod
-    def validate_title(cls, v: str) -> str:
-        if len(v.strip()) < 1:
-            raise ValueError('El título es requerido')
-        return v.strip()
-    
-    @field_validator('author')
-    @classmethod
-    def validate_author(cls, v: str) -> str:
-        if len(v.strip()) < 1:
-            raise ValueError('El autor es requerido')
-        return v.strip()
-    
-    @field_validator('publication_year')
-    @classmethod
-    def validate_year(cls, v: Optional[int]) -> Optional[int]:
-        if v is not None and (v < 1000 or v > datetime.now().year + 1):
-            raise ValueError(f'Año debe estar entre 1000 y {datetime.now().year + 1}')
-        return v
-
-class BookCreate(BookBase):
-    pass
-
-class BookResponse(BookBase):
-    id: int
-    is_available: bool
-    created_at: datetime
-    
-    model_config = {"from_attributes": True}
-
-class LoanBase(BaseModel):
-    user_id: int
-    book_id: int
-
-class LoanCreate(LoanBase):
-    pass
-
-class LoanResponse(LoanBase):
-    id: int
-    loan_date: datetime
-    return_date: Optional[datetime] = None
-    is_returned: bool
-    created_at: datetime
-    
-    model_config = {"from_attributes": True}
+with engine.begin() as connection:
+    init_db(connection)
 
 # ============================
 # DEPENDENCIAS
 # ============================
 
-def get_db():
+# Un turno por conexión del pool, esperado en el event loop (sin ocupar un
+# hilo): una petición entra al threadpool con su conexión asegurada, así que
+# ningún hilo se queda esperando al pool (ver DB_POOL_SIZE en biblioteca_comun).
+# El semáforo se crea en el event loop que lo usa (uno por loop)
+_db_slots: Tuple[Optional[asyncio.AbstractEventLoop], Optional[asyncio.Semaphore]] = (None, None)
+
+async def db_slot():
+    global _db_slots
+    if DB_MAX_CONNECTIONS is None:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    if _db_slots[0] is not loop:
+        _db_slots = (loop, asyncio.Semaphore(DB_MAX_CONNECTIONS))
+    async with _db_slots[1]:
+        yield
+
+def get_db(_slot: None = Depends(db_slot)):
     db = SessionLocal()
     try:
         yield db
@@ -202,9 +89,10 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @app.get("/api/v1/users/", response_model=List[UserResponse])
-def list_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Listar usuarios con paginación"""
-    users = db.query(User).offset(skip).limit(limit).all()
+def list_users(request: Request, response: Response, page: Page = Depends(), db: Session = Depends(get_db)):
+    """Listar usuarios con paginación (cursor/after_id o skip)"""
+    users = page.apply(db.query(User), User).all()
+    page.add_next_link(request, response, users)
     return users
 
 @app.get("/api/v1/users/{user_id}", response_model=UserResponse)
@@ -280,9 +168,10 @@ def create_book(book: BookCreate, db: Session = Depends(get_db)):
     return db_book
 
 @app.get("/api/v1/books/", response_model=List[BookResponse])
-def list_books(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Listar libros con paginación"""
-    books = db.query(Book).offset(skip).limit(limit).all()
+def list_books(request: Request, response: Response, page: Page = Depends(), db: Session = Depends(get_db)):
+    """Listar libros con paginación (cursor/after_id o skip)"""
+    books = page.apply(db.query(Book), Book).all()
+    page.add_next_link(request, response, books)
     return books
 
 @app.get("/api/v1/books/{book_id}", response_model=BookResponse)
@@ -293,9 +182,10 @@ def get_book(book_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Libro no encontrado")
     return book
 
-@app.get("/api/v1/books/search/{title}", response_model=List[BookResponse])
-def search_books(title: str, db: Session = Depends(get_db)):
-    """Buscar libros por título"""
+@app.get("/api/v1/books/search/{title}", response_model=List[BookResponse], deprecated=True)
+def search_books(request: Request, response: Response, title: str, db: Session = Depends(get_db)):
+    """Buscar libros por título (obsoleto: recorre toda la tabla; usar /api/v1/search/books)"""
+    deprecate_title_search(request, response, title)
     books = db.query(Book).filter(Book.title.contains(title)).all()
     return books
 
@@ -330,6 +220,20 @@ def delete_book(book_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Libro eliminado correctamente"}
 
+@app.get("/api/v1/search/books", response_model=List[BookResponse])
+def search_books_fulltext(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, description="Palabras a buscar en título, autor e ISBN"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Búsqueda de texto completo ordenada por relevancia (FTS5 + bm25)"""
+    books = db.scalars(search_books_statement(q, skip, limit)).all()
+    add_offset_next_link(request, response, skip, limit, books)
+    return books
+
 # ============================
 # ENDPOINTS DE PRÉSTAMOS
 # ============================
@@ -372,9 +276,17 @@ def create_loan(loan: LoanCreate, db: Session = Depends(get_db)):
     return db_loan
 
 @app.get("/api/v1/loans/", response_model=List[LoanResponse])
-def list_loans(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Listar préstamos con paginación"""
-    loans = db.query(Loan).offset(skip).limit(limit).all()
+def list_loans(request: Request, response: Response, page: Page = Depends(), db: Session = Depends(get_db)):
+    """Listar préstamos con paginación (cursor/after_id o skip)"""
+    loans = page.apply(db.query(Loan), Loan).all()
+    page.add_next_link(request, response, loans)
+    return loans
+
+# Antes de /loans/{loan_id}: si no, "active" se toma como un ID y responde 422
+@app.get("/api/v1/loans/active", response_model=List[LoanResponse])
+def get_active_loans(db: Session = Depends(get_db)):
+    """Obtener todos los préstamos activos"""
+    loans = db.query(Loan).filter(Loan.is_returned == False).all()
     return loans
 
 @app.get("/api/v1/loans/{loan_id}", response_model=LoanResponse)
@@ -414,52 +326,29 @@ def get_user_loans(user_id: int, db: Session = Depends(get_db)):
     loans = db.query(Loan).filter(Loan.user_id == user_id).all()
     return loans
 
-@app.get("/api/v1/loans/active", response_model=List[LoanResponse])
-def get_active_loans(db: Session = Depends(get_db)):
-    """Obtener todos los préstamos activos"""
-    loans = db.query(Loan).filter(Loan.is_returned == False).all()
-    return loans
-
 # ============================
 # ENDPOINTS DE ESTADÍSTICAS
 # ============================
 
+@app.get("/api/v1/stats")
+def get_dashboard_stats(db: Session = Depends(get_db)):
+    """Estadísticas de libros, usuarios y préstamos en una sola consulta"""
+    return dashboard_stats(db.execute(stats_statement("books", "users", "loans")).mappings().one())
+
 @app.get("/api/v1/stats/books")
 def get_books_stats(db: Session = Depends(get_db)):
     """Obtener estadísticas de libros"""
-    total_books = db.query(Book).count()
-    available_books = db.query(Book).filter(Book.is_available == True).count()
-    borrowed_books = total_books - available_books
-    
-    return {
-        "total_books": total_books,
-        "available_books": available_books,
-        "borrowed_books": borrowed_books
-    }
+    return books_stats(db.execute(stats_statement("books")).mappings().one())
 
 @app.get("/api/v1/stats/users")
 def get_users_stats(db: Session = Depends(get_db)):
     """Obtener estadísticas de usuarios"""
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    
-    return {
-        "total_users": total_users,
-        "active_users": active_users
-    }
+    return users_stats(db.execute(stats_statement("users")).mappings().one())
 
 @app.get("/api/v1/stats/loans")
 def get_loans_stats(db: Session = Depends(get_db)):
     """Obtener estadísticas de préstamos"""
-    total_loans = db.query(Loan).count()
-    active_loans = db.query(Loan).filter(Loan.is_returned == False).count()
-    returned_loans = db.query(Loan).filter(Loan.is_returned == True).count()
-    
-    return {
-        "total_loans": total_loans,
-        "active_loans": active_loans,
-        "returned_loans": returned_loans
-    }
+    return loans_stats(db.execute(stats_statement("loans")).mappings().one())
 
 # ============================
 # ENDPOINT RAÍZ
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Script de pruebas para API de Biblioteca - Semana 4
+Enfocado en que la búsqueda de texto completo siga a la tabla de libros
+y en la paginación por cursor de los listados
+
+Ejecutar: python test_api.py
+Asegúrate de que la API esté corriendo en http://localhost:8001
+(para el modo async: API_URL=http://localhost:8002 python test_api.py)
+
+Dependencias requeridas:
+- pip install requests
+
+O instalar todas las dependencias:
+- pip install -r requirements.txt
+"""
+
+import os
+import sqlite3
+import time
+
+# Verificar que requests esté instalado
+try:
+    import requests
+except ImportError:
+    print("❌ Error: La biblioteca 'requests' no está instalada.")
+    print("🔧 Solución: Ejecuta 'pip install requests' o 'pip install -r requirements.txt'")
+    exit(1)
+
+BASE_URL = os.getenv("API_URL", "http://localhost:8001")
+# Misma variable que usa la API; la última prueba abre el archivo directamente
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./library.db")
+
+# Palabra que solo aparece en los libros de esta ejecución
+RUN_WORD = f"pruebafts{int(time.time() * 1000)}"
+
+def search_ids(q):
+    """IDs que devuelve la búsqueda de texto completo para `q`"""
+    response = requests.get(f"{BASE_URL}/api/v1/search/books", params={"q": q})
+    response.raise_for_status()
+    return [book["id"] for book in response.json()]
+
+def test_connection():
+    """Probar conexión básica"""
+    print("🔍 Probando conexión...")
+    try:
+        response = requests.get(f"{BASE_URL}/")
+        if response.status_code == 200:
+            print("✅ Conexión exitosa")
+            return True
+        else:
+            print(f"❌ Error de conexión: {response.status_code}")
+            return False
+    except requests.exceptions.ConnectionError:
+        print("❌ No se puede conectar a la API. ¿Está ejecutándose?")
+        return False
+
+def test_search_after_insert():
+    """Un libro nuevo aparece en la búsqueda (trigger books_fts_insert)"""
+    print("\n📚 Probando búsqueda de un libro recién creado...")
+    try:
+        response = requests.post(f"{BASE_URL}/api/v1/books/", json={
+            "title": f"El jardín {RUN_WORD}",
+            "author": "Autora de Prueba",
+            "publication_year": 2001
+        })
+        if response.status_code != 201:
+            print(f"❌ No se pudo crear el libro: {response.status_code}")
+            return False, None
+        book_id = response.json()["id"]
+        
+        if search_ids(RUN_WORD) == [book_id]:
+            print("✅ El libro nuevo se encuentra por su título")
+            return True, book_id
+        print(f"❌ La búsqueda de '{RUN_WORD}' no devolvió el libro {book_id}")
+        return False, book_id
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False, None
+
+def test_search_after_update(book_id):
+    """Al cambiar el título se busca por el nuevo y no por el viejo (trigger books_fts_update)"""
+    if book_id is None:
+        print("\n⚠️  Saltando prueba de actualización (no hay libro)")
+        return False
+    
+    print(f"\n✏️  Probando búsqueda tras actualizar el libro {book_id}...")
+    try:
+        response = requests.put(f"{BASE_URL}/api/v1/books/{book_id}", json={
+            "title": f"La sombra {RUN_WORD}x",
+            "author": "Autora de Prueba",
+            "publication_year": 2001
+        })
+        if response.status_code != 200:
+            print(f"❌ No se pudo actualizar el libro: {response.status_code}")
+            return False
+        
+        # "jardín" solo estaba en el título viejo
+        if book_id in search_ids(f"jardín {RUN_WORD}"):
+            print("❌ El título viejo sigue en el índice")
+            return False
+        if search_ids(f"sombra {RUN_WORD}x") != [book_id]:
+            print("❌ El título nuevo no está en el índice")
+            return False
+        print("✅ El índice sigue al título actualizado")
+        return True
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
+def test_search_after_delete(book_id):
+    """Un libro borrado deja de aparecer (trigger books_fts_delete)"""
+    if book_id is None:
+        print("\n⚠️  Saltando prueba de borrado (no hay libro)")
+        return False
+    
+    print(f"\n🗑️  Probando búsqueda tras borrar el libro {book_id}...")
+    try:
+        response = requests.delete(f"{BASE_URL}/api/v1/books/{book_id}")
+        if response.status_code != 200:
+            print(f"❌ No se pudo borrar el libro: {response.status_code}")
+            return False
+        
+        if search_ids(RUN_WORD):
+            print("❌ El libro borrado sigue apareciendo en la búsqueda")
+            return False
+        print("✅ El libro borrado ya no aparece")
+        return True
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
+def test_search_index_integrity():
+    """books_fts coincide con la tabla books (integrity-check de FTS5)"""
+    print("\n🔎 Comparando books_fts con la tabla books...")
+    path = DATABASE_URL.split(":///", 1)[-1]
+    if not DATABASE_URL.startswith("sqlite") or not os.path.exists(path):
+        print(f"⚠️  Saltando prueba de integridad (no se encuentra la base SQLite {path})")
+        return True
+    
+    # Un trigger que falte no siempre se ve por la API: el JOIN con books
+    # oculta las entradas de libros borrados, pero siguen ocupando el índice
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("INSERT INTO books_fts(books_fts, rank) VALUES ('integrity-check', 1)")
+        print("✅ El índice de búsqueda coincide con los libros")
+        return True
+    except sqlite3.DatabaseError as e:
+        print(f"❌ books_fts no coincide con books: {e}")
+        return False
+    finally:
+        connection.close()
+
+def test_search_ranking():
+    """Orden por relevancia (bm25) en todas las coincidencias y aviso en la ruta obsoleta"""
+    print("\n🏅 Probando el orden por relevancia de la búsqueda...")
+    word = f"{RUN_WORD}r"
+    created = []
+    try:
+        # El de menor id solo coincide por autor; el título pesa más en bm25
+        for payload in ({"title": "Sin coincidencia", "author": f"Autora {word}"},
+                        {"title": f"Título {word}", "author": "Autora de Prueba"}):
+            response = requests.post(f"{BASE_URL}/api/v1/books/", json=payload)
+            if response.status_code != 201:
+                print(f"❌ No se pudo crear el libro: {response.status_code}")
+                return False
+            created.append(response.json()["id"])
+        
+        by_author, by_title = created
+        if search_ids(word) != [by_title, by_author]:
+            print(f"❌ Orden inesperado: {search_ids(word)}, esperado {[by_title, by_author]}")
+            return False
+        response = requests.get(f"{BASE_URL}/api/v1/search/books", params={"q": word, "skip": 1})
+        if [book["id"] for book in response.json()] != [by_author]:
+            print(f"❌ skip=1 no continúa con el siguiente resultado: {response.json()}")
+            return False
+        
+        response = requests.get(f"{BASE_URL}/api/v1/books/search/{word}")
+        if response.headers.get("Deprecation") != "true" or "successor-version" not in response.links:
+            print("❌ La búsqueda por título no avisa que está obsoleta")
+            return False
+        print("✅ La búsqueda ordena por relevancia y la ruta vieja apunta a la nueva")
+        return True
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+    finally:
+        for book_id in created:
+            requests.delete(f"{BASE_URL}/api/v1/books/{book_id}")
+
+def test_cursor_pagination():
+    """El cursor de X-Next-Cursor y el Link rel="next" continúan justo después de la página"""
+    print("\n📄 Probando paginación con cursor...")
+    created = []
+    try:
+        for number in range(3):
+            response = requests.post(f"{BASE_URL}/api/v1/books/", json={
+                "title": f"Página {number} {RUN_WORD}",
+                "author": "Autora de Prueba"
+            })
+            if response.status_code != 201:
+                print(f"❌ No se pudo crear el libro: {response.status_code}")
+                return False
+            created.append(response.json()["id"])
+        
+        # Primera página: los dos primeros libros creados
+        first = requests.get(f"{BASE_URL}/api/v1/books/", params={"limit": 2, "after_id": created[0] - 1})
+        if [book["id"] for book in first.json()] != created[:2]:
+            print(f"❌ Primera página inesperada: {first.json()}")
+            return False
+        cursor = first.headers.get("X-Next-Cursor")
+        next_url = first.links.get("next", {}).get("url")
+        if not cursor or not next_url:
+            print("❌ Falta X-Next-Cursor o Link rel=\"next\" en una página completa")
+            return False
+        
+        # El cursor y el enlace deben llevar a la misma página siguiente
+        by_cursor = requests.get(f"{BASE_URL}/api/v1/books/", params={"limit": 2, "cursor": cursor})
+        by_link = requests.get(next_url)
+        if by_cursor.status_code != 200 or by_link.status_code != 200:
+            print(f"❌ La página siguiente falló: {by_cursor.status_code} / {by_link.status_code}")
+            return False
+        if by_cursor.json() != by_link.json() or by_cursor.json()[0]["id"] != created[2]:
+            print("❌ El cursor no continúa después del último libro de la página")
+            return False
+        print("✅ Cursor y Link rel=\"next\" llevan a la página siguiente")
+        return True
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+    finally:
+        for book_id in created:
+            requests.delete(f"{BASE_URL}/api/v1/books/{book_id}")
+
+def test_pagination_errors():
+    """Cursores inválidos, combinaciones excluyentes y límite de `limit`"""
+    print("\n🚧 Probando errores de paginación...")
+    cases = [
+        ("cursor inválido", {"cursor": "no-es-un-cursor"}, 400),
+        ("cursor con prefijo ajeno", {"cursor": "eDox"}, 400),  # "x:1"
+        ("cursor + skip", {"cursor": "aWQ6MQ", "skip": 10}, 400),
+        ("cursor + after_id", {"cursor": "aWQ6MQ", "after_id": 1}, 400),
+        ("limit por encima del máximo", {"limit": 1001}, 422),
+        ("limit cero", {"limit": 0}, 422),
+    ]
+    try:
+        passed = True
+        for label, params, expected in cases:
+            status_code = requests.get(f"{BASE_URL}/api/v1/books/", params=params).status_code
+            if status_code != expected:
+                print(f"❌ {label}: {status_code}, esperado {expected}")
+                passed = False
+        if passed:
+            print("✅ Los parámetros inválidos se rechazan")
+        return passed
+    except Exception as e:
+        print(f"❌ Error en la prueba: {e}")
+        return False
+
+def run_all_tests():
+    """Ejecutar todas las pruebas"""
+    print("🧪 INICIANDO PRUEBAS DE BÚSQUEDA Y PAGINACIÓN")
+    print("=" * 60)
+    
+    tests = []
+    
+    # Test 1: Conexión
+    if test_connection():
+        tests.append(True)
+    else:
+        tests.append(False)
+        print("\n❌ No se puede continuar sin conexión")
+        return
+    
+    # Test 2: Alta
+    success, book_id = test_search_after_insert()
+    tests.append(success)
+    
+    # Test 3: Actualización
+    tests.append(test_search_after_update(book_id))
+    
+    # Test 4: Borrado
+    tests.append(test_search_after_delete(book_id))
+    
+    # Test 5: Índice completo frente a la tabla
+    tests.append(test_search_index_integrity())
+    
+    # Test 6: Orden por relevancia
+    tests.append(test_search_ranking())
+    
+    # Test 7: Paginación con cursor
+    tests.append(test_cursor_pagination())
+    
+    # Test 8: Errores de paginación
+    tests.append(test_pagination_errors())
+    
+    # Resultados
+    passed = sum(tests)
+    total = len(tests)
+    
+    print("\n" + "=" * 60)
+    print(f"🏆 RESULTADO: {passed}/{total} pruebas pasaron")
+    
+    if passed == total:
+        print("🎉 ¡Excelente! La búsqueda sigue a los libros y la paginación funciona.")
+    else:
+        print("⚠️  Revisa los triggers de books_fts y la clase Page en biblioteca_comun.py")
+
+def main():
+    """Función principal"""
+    print("API de Biblioteca - Semana 4 - Script de Pruebas")
+    print("Enfoque: Búsqueda de texto completo (FTS5)")
+    print(f"Asegúrate de que tu API esté ejecutándose en {BASE_URL}")
+    input("Presiona Enter para continuar...")
+    
+    run_all_tests()
+
+if __name__ == "__main__":
+    main()